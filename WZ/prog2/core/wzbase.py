@@ -1,7 +1,7 @@
 """
 core/wzbase.py
 
-Last updated:  2024-05-05
+Last updated:  2026-10-16
 
 Basic configuration and structural stuff.
 
@@ -56,6 +56,26 @@ SYSTEM: dict[str, str] = None   # System configuration information
 class DB_Error(Exception):
     """An exception class for errors occurring during database access."""
 
+# SQLite connection settings ("PRAGMA" statements). The profile can be
+# chosen by the "DB_PROFILE" entry in the SYSTEM file. "NETWORK" avoids
+# the WAL journal mode, which doesn't work on network shares.
+DB_PROFILES = {
+    "LOCAL": (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 268435456",
+        "temp_store = MEMORY",
+    ),
+    "NETWORK": (
+        "journal_mode = DELETE",
+        "synchronous = FULL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 0",
+        "temp_store = MEMORY",
+    ),
+}
+
 ### -----
 
 __TRANSLATIONS = ConfigParser(interpolation = None)
@@ -210,6 +230,7 @@ class WZDatabase:
             dbexists = os.path.isfile(self.path)
             # Retain the "connection":
             self.conn = sqlite3.connect(self.path)
+            self.set_profile(SYSTEM.get("DB_PROFILE"))
         # Read all "nodes"
         self.node_tables = {}
         self.nodes = {}
@@ -228,6 +249,39 @@ class WZDatabase:
                 STRICT;
             """)
 
+    def set_profile(self, profile: str = None):
+        """Apply the SQLite settings of the given connection profile
+        (see <DB_PROFILES>, the name is not case-sensitive). If no valid
+        profile is given, a path starting with "//" or "\\\\" is taken
+        to be on a network share. If the WAL journal mode can't be used,
+        the "NETWORK" profile is used instead.
+        """
+        if profile:
+            p = profile.upper()
+            if p not in DB_PROFILES:
+                REPORT_ERROR(T("UNKNOWN_DB_PROFILE",
+                    profile = profile,
+                    profiles = ", ".join(DB_PROFILES)
+                ))
+                p = None
+        else:
+            p = None
+        if not p:
+            if self.path.startswith(("//", "\\\\")):
+                p = "NETWORK"
+            else:
+                p = "LOCAL"
+        cursor = self.conn.cursor()
+        for pragma in DB_PROFILES[p]:
+            cursor.execute(f"PRAGMA {pragma}")
+            if pragma == "journal_mode = WAL":
+                # The new journal mode is returned
+                if cursor.fetchone()[0] != "wal":
+                    cursor.close()
+                    self.set_profile("NETWORK")
+                    return
+        cursor.close()
+
     def data_path(self, *items):
         ll = []
         for item in items:
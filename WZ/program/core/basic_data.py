@@ -1,5 +1,5 @@
 """
-core/basic_data.py - last updated 2024-02-17
+core/basic_data.py - last updated 2026-10-16
 
 Configuration and other basic data dependent on the database.
 
@@ -107,6 +107,13 @@ def get_database():
         __DB = Database(dbpath)
         # Set up the CONFIG table
         CONFIG.init(__DB)
+        # The connection profile can be set in the configuration, it
+        # is applied only now (once)
+        try:
+            profile = CONFIG.DB_PROFILE
+        except KeyError:
+            profile = None
+        __DB.set_profile(profile)
         # ... and the CALENDAR table
         CALENDAR.init(__DB)
     return __DB
@@ -1,7 +1,7 @@
 """
 core/db_access.py
 
-Last updated:  2024-02-07
+Last updated:  2026-10-16
 
 Helper functions for accessing the database.
 
@@ -73,11 +73,38 @@ CONFIG = {}     # the configuration mapping of the current database
 
 DB_TABLES = {}  # map the table names to their handler classes
 
+# SQLite connection settings. The write-ahead log ("WAL") makes commits
+# much cheaper, but it relies on shared memory, which is not safe when
+# the database is on a network share. There the rollback journal is
+# used ("NETWORK"). The profile can be set by the configuration item
+# DB_PROFILE (see <basic_data.get_database>).
+DB_PROFILES = {
+    "LOCAL": (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 268435456",
+        "temp_store = MEMORY",
+    ),
+    "NETWORK": (
+        "journal_mode = DELETE",
+        "synchronous = FULL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 0",
+        "temp_store = MEMORY",
+    ),
+}
+
 ### -----
 
 
 class Database:
-    def __init__(self, dbpath):
+    def __init__(self, dbpath, profile: str = None):
+        """Open the database at <dbpath>. If a connection profile is
+        given, it is applied. Otherwise no options are set here, the
+        profile can be set later (see <set_profile>), for example when
+        it is read from the database's own configuration.
+        """
         if not os.path.isfile(dbpath):
             REPORT_WARNING(f"TODO: No database at:\n  {dbpath}")
         self.path = dbpath
@@ -93,6 +120,41 @@ class Database:
         # Retain the "connection":
         self.conn = con
         self.tables = {}
+        if profile:
+            self.set_profile(profile)
+
+    def set_profile(self, profile: str = None):
+        """Set the connection options ("PRAGMA"s) of the given profile
+        (see <DB_PROFILES>, the name is not case-sensitive). If no valid
+        profile is given, a path starting with "//" or "\\\\" is taken
+        to be on a network share. If the WAL journal mode can't be used,
+        the "NETWORK" profile is used instead.
+        """
+        if profile:
+            p = profile.upper()
+            if p not in DB_PROFILES:
+                REPORT_ERROR(T("UNKNOWN_DB_PROFILE",
+                    profile = profile,
+                    profiles = ", ".join(DB_PROFILES)
+                ))
+                p = None
+        else:
+            p = None
+        if not p:
+            if self.path.startswith(("//", "\\\\")):
+                p = "NETWORK"
+            else:
+                p = "LOCAL"
+        cursor = self.conn.cursor()
+        for pragma in DB_PROFILES[p]:
+            cursor.execute(f"PRAGMA {pragma}")
+            if pragma == "journal_mode = WAL":
+                # The new journal mode is returned
+                if cursor.fetchone()[0] != "wal":
+                    cursor.close()
+                    self.set_profile("NETWORK")
+                    return
+        cursor.close()
 
     def query(self, sql: str, data: dict|tuple = None) -> sqlite3.Cursor:
         #print("§query:", sql, "\n  --", data)
@@ -2,7 +2,7 @@
 """
 core/activities.py
 
-Last updated:  2023-08-10
+Last updated:  2026-10-16
 
 Collect basic information on "activities".
 
@@ -44,7 +44,6 @@ from typing import NamedTuple
 from core.db_access import (
     db_read_fields,
     db_select,
-    db_read_unique_field,
     Record
 )
 
@@ -69,9 +68,10 @@ class ActivityGroup(NamedTuple):
     lessons: list[Record]
 
 
-def read_from_db():
-    """Read all the relevant data from the database tables concerning
-    the workload of classes and teachers.
+def read_course_records() -> list[Record]:
+    """Read the courses which have COURSE_LESSONS entries, together
+    with their lesson-group, lesson-data and payment information, in a
+    single query.
     """
     q = """select
         Course,
@@ -97,7 +97,31 @@ def read_from_db():
 
         order by CLASS, SUBJECT, GRP, TEACHER
     """
-    records = db_select(q)
+    return db_select(q)
+
+
+def read_lessons() -> dict[int, list[Record]]:
+    """Read all LESSONS entries in a single query.
+    Return a mapping, lesson-group -> list of records (ordered by
+    lesson-id).
+    """
+    lg_lessons = {}
+    for rec in db_select(
+        "select * from LESSONS where Lesson_group != 0 order by Lid"
+    ):
+        lg = rec["Lesson_group"]
+        try:
+            lg_lessons[lg].append(rec)
+        except KeyError:
+            lg_lessons[lg] = [rec]
+    return lg_lessons
+
+
+def read_from_db():
+    """Read all the relevant data from the database tables concerning
+    the workload of classes and teachers.
+    """
+    records = read_course_records()
     lg_ll = {}
     for lg, l in db_read_fields("LESSONS", ("Lesson_group", "LENGTH")):
         try:
@@ -135,46 +159,42 @@ def collect_activity_groups() -> dict[int, ActivityGroup]:
     """Read all activities with lessons from database. Gather the
     information needed for the timetable for each lesson-group.
     """
-    # Get activities from database
-    activities = read_from_db()
-    c_activities = activities["C_ACTIVITIES"]
+    # The data is read with a few set-based queries, the activity
+    # groups are built in memory.
+    lg_lessons = read_lessons()
+    classrooms = dict(db_read_fields("CLASSES", ("CLASS", "CLASSROOM")))
+    c_activities = {}
+    for rec in read_course_records():
+        try:
+            c_activities[rec["CLASS"]].append(rec)
+        except KeyError:
+            c_activities[rec["CLASS"]] = [rec]
     lg_data = {}    # { lesson-group -> ActivityGroup }
     for klass in sorted(c_activities):
-        classroom = db_read_unique_field("CLASSES", "CLASSROOM", CLASS=klass)
+        classroom = classrooms[klass]
         for ai in c_activities[klass]:
             if (lg := ai["Lesson_group"]) == 0:
                 continue        # not relevant for timetable (no lessons)
+            course = CourseWithRoom(
+                ai["CLASS"],
+                ai["GRP"],
+                ai["SUBJECT"],
+                ai["TEACHER"],
+                ai["ROOM"].replace('$', classroom)
+            )
             try:
                 data = lg_data[lg]
             except KeyError:
-                lessons = db_select(
-                    f"select * from LESSONS where Lesson_group = {lg}"
-                )
+                lessons = lg_lessons.get(lg)
                 assert lessons
                 lg_data[lg] = ActivityGroup(
-                    [
-                        CourseWithRoom(
-                            ai["CLASS"],
-                            ai["GRP"],
-                            ai["SUBJECT"],
-                            ai["TEACHER"],
-                            ai["ROOM"].replace('$', classroom)
-                        )
-                    ],
+                    [course],
                     ai["BLOCK_SID"],
                     ai["BLOCK_TAG"],
                     lessons,
                 )
             else:
-                data.course_list.append(
-                    CourseWithRoom(
-                        ai["CLASS"],
-                        ai["GRP"],
-                        ai["SUBJECT"],
-                        ai["TEACHER"],
-                        ai["ROOM"].replace('$', classroom)
-                    )
-                )
+                data.course_list.append(course)
     return lg_data
 
 
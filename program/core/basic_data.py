@@ -1,5 +1,5 @@
 """
-core/basic_data.py - last updated 2023-08-11
+core/basic_data.py - last updated 2026-10-16
 
 Handle caching of the basic data sources
 
@@ -23,18 +23,21 @@ T = TRANSLATIONS("core.basic_data")
 
 ### +++++
 
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 from core.db_access import (
     db_read_fields,
     db_key_value_list,
     KeyValueList,
+    add_change_handler,
 )
 from core.classes import Classes, NO_CLASS, GROUP_ALL
 from core.teachers import Teachers, NO_TEACHER
 from ui.ui_base import QRegularExpression  ### QtCore
 
 SHARED_DATA = {}
+# The keys of the cached entries depending on each table (table -> set)
+TABLE_KEYS = {}
 
 DECIMAL_SEP = CONFIG["DECIMAL_SEP"]
 __FLOAT = f"[1-9]?[0-9](?:{DECIMAL_SEP}[0-9]{{1,3}})?"
@@ -48,8 +51,40 @@ WEIGHTS = {c for c in '-123456789+'}
 
 
 def clear_cache():
-    # IMPORTANT: This must be called after any data change.
+    """Discard all cached data.
+    Changes made using the write functions in <core.db_access> only
+    discard the entries which depend on the changed table (see
+    <cache_data>), so this is only needed after other changes.
+    """
     SHARED_DATA.clear()
+    TABLE_KEYS.clear()
+
+
+def cache_data(key: str, data, *tables: str):
+    """Cache the data under the given key. It is discarded when one of
+    the given tables, from which it was read, is changed.
+    Return the data.
+    """
+    SHARED_DATA[key] = data
+    for table in tables:
+        try:
+            TABLE_KEYS[table.upper()].add(key)
+        except KeyError:
+            TABLE_KEYS[table.upper()] = {key}
+    return data
+
+
+def table_changed(table: Optional[str]):
+    """Discard the cached entries which depend on the given table
+    (<None> for all tables).
+    """
+    if table is None:
+        clear_cache()
+        return
+    for key in TABLE_KEYS.pop(table.upper(), ()):
+        SHARED_DATA.pop(key, None)
+
+add_change_handler(table_changed)
 
 
 def get_days() -> KeyValueList:
@@ -61,8 +96,7 @@ def get_days() -> KeyValueList:
     except KeyError:
         pass
     days = db_key_value_list("TT_DAYS", "TAG", "NAME", "N")
-    SHARED_DATA["DAYS"] = days
-    return days
+    return cache_data("DAYS", days, "TT_DAYS")
 
 
 def get_periods() -> KeyValueList:
@@ -74,8 +108,7 @@ def get_periods() -> KeyValueList:
     except KeyError:
         pass
     periods = db_key_value_list("TT_PERIODS", "TAG", "NAME", "N")
-    SHARED_DATA["PERIODS"] = periods
-    return periods
+    return cache_data("PERIODS", periods, "TT_PERIODS")
 
 
 def get_classes() -> Classes:
@@ -87,8 +120,7 @@ def get_classes() -> Classes:
     except KeyError:
         pass
     classes = Classes()
-    SHARED_DATA["CLASSES"] = classes
-    return classes
+    return cache_data("CLASSES", classes, "CLASSES")
 
 
 def get_teachers() -> Teachers:
@@ -100,8 +132,7 @@ def get_teachers() -> Teachers:
     except KeyError:
         pass
     teachers = Teachers()
-    SHARED_DATA["TEACHERS"] = teachers
-    return teachers
+    return cache_data("TEACHERS", teachers, "TEACHERS")
 
 
 def get_subjects() -> KeyValueList:
@@ -113,8 +144,7 @@ def get_subjects() -> KeyValueList:
     except KeyError:
         pass
     subjects = db_key_value_list("SUBJECTS", "SID", "NAME", sort_field="NAME")
-    SHARED_DATA["SUBJECTS"] = subjects
-    return subjects
+    return cache_data("SUBJECTS", subjects, "SUBJECTS")
 
 
 def get_subjects_with_sorting() -> dict:
@@ -132,8 +162,7 @@ def get_subjects_with_sorting() -> dict:
         row.insert(0, i)
         sid2data[row[1]] = row
         i += 1
-    SHARED_DATA["SUBJECTS_SORTED"] = sid2data
-    return sid2data
+    return cache_data("SUBJECTS_SORTED", sid2data, "SUBJECTS")
 
 
 def get_rooms() -> KeyValueList:
@@ -145,8 +174,7 @@ def get_rooms() -> KeyValueList:
     except KeyError:
         pass
     rooms = db_key_value_list("ROOMS", "RID", "NAME", sort_field="RID")
-    SHARED_DATA["ROOMS"] = rooms
-    return rooms
+    return cache_data("ROOMS", rooms, "ROOMS")
 
 
 class ParallelTag(NamedTuple):
@@ -239,8 +267,7 @@ def get_payment_weights() -> KeyValueList:
     payment_weights = db_key_value_list(
         "PAY_FACTORS", "PAY_TAG", "PAY_WEIGHT", check=check
     )
-    SHARED_DATA["PAYMENT"] = payment_weights
-    return payment_weights
+    return cache_data("PAYMENT", payment_weights, "PAY_FACTORS")
 
 
 #TODO: Is this still in use?
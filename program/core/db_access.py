@@ -1,7 +1,7 @@
 """
 core/db_access.py
 
-Last updated:  2023-10-02
+Last updated:  2026-10-16
 
 Helper functions for accessing the database.
 
@@ -51,7 +51,7 @@ T = TRANSLATIONS("core.db_access")
 
 ### +++++
 
-from typing import Union
+from typing import Optional, Union
 
 from datetime import datetime
 from shutil import copyfile
@@ -72,20 +72,135 @@ db_sqlrecord = QSqlRecord
 class NoRecord(Exception):
     pass
 
+# The maximum number of prepared queries kept in the cache
+QUERY_CACHE_SIZE = 200
+
+# SQLite connection settings, chosen by the configuration item
+# DB_PROFILE (in CONFIG/BASE). The write-ahead log ("WAL") makes
+# commits much cheaper, but it relies on shared memory, which is not
+# safe when the database is on a network share. There the rollback
+# journal is used ("NETWORK"). A path starting with "//" or "\\" is
+# taken to be on a network share if no profile is configured.
+DB_PROFILES = {
+    "LOCAL": (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 268435456",
+        "temp_store = MEMORY",
+    ),
+    "NETWORK": (
+        "journal_mode = DELETE",
+        "synchronous = FULL",
+        "cache_size = -16000",      # KiB
+        "mmap_size = 0",
+        "temp_store = MEMORY",
+    ),
+}
 
 ### -----
 
+# Prepared queries for the default connection, keyed by the query text
+# (with "?" placeholders for the values), see <prepared_query>.
+_QUERY_CACHE = {}
 
-def open_database(dbfile=None):
+# Functions to be called when the contents of a table are changed by
+# the helper functions here, see <add_change_handler>.
+_CHANGE_HANDLERS = []
+
+
+def add_change_handler(handler):
+    """Register a function to be called with the name of a table
+    after a change to its contents (by one of the write functions in
+    this module: <db_update_fields>, <db_new_row>, <db_delete_rows>
+    and the <db_bulk_*> functions). When another database is opened,
+    the function is called with <None>.
+    This allows cached data to be discarded only when necessary.
+    """
+    if handler not in _CHANGE_HANDLERS:
+        _CHANGE_HANDLERS.append(handler)
+
+
+def table_changed(table: Optional[str]):
+    """Inform the registered functions (see <add_change_handler>) of a
+    change to the given table (<None> for all tables).
+    This must also be called after changes made in other ways.
+    """
+    for handler in _CHANGE_HANDLERS:
+        handler(table)
+
+
+def db_profile(dbpath: str) -> str:
+    """Return the name of the connection profile (see <DB_PROFILES>)
+    for the database at the given path.
+    The configured profile (DB_PROFILE) is not case-sensitive. If it is
+    not set or invalid, a path starting with "//" or "\\\\" is taken to
+    be on a network share.
+    """
+    try:
+        profile = CONFIG["DB_PROFILE"].upper()
+    except KeyError:
+        pass
+    else:
+        if profile in DB_PROFILES:
+            return profile
+        REPORT(
+            "ERROR",
+            T["UNKNOWN_DB_PROFILE"].format(
+                profile=CONFIG["DB_PROFILE"],
+                profiles=", ".join(DB_PROFILES),
+            )
+        )
+    if dbpath.startswith(("//", "\\\\")):
+        return "NETWORK"
+    return "LOCAL"
+
+
+def apply_db_profile(con: QSqlDatabase, profile: str):
+    """Set the connection options ("PRAGMA"s) of the given profile
+    (see <DB_PROFILES>). If the WAL journal mode can't be used, the
+    "NETWORK" profile is used instead.
+    """
+    query = QSqlQuery(con)
+    for pragma in DB_PROFILES[profile]:
+        if not query.exec(f"PRAGMA {pragma}"):
+            REPORT(
+                "ERROR",
+                f"SQL query failed: {query.lastError().text()}\n"
+                f"  PRAGMA {pragma}"
+            )
+        elif pragma == "journal_mode = WAL":
+            # The new journal mode is returned
+            if not (query.next() and query.value(0) == "wal"):
+                query.finish()
+                apply_db_profile(con, "NETWORK")
+                return
+        query.finish()
+
+
+def _checkpoint():
+    """Transfer the contents of the write-ahead log (if any) of the
+    default connection to the database file, so that it can be copied.
+    """
+    con = QSqlDatabase.database()
+    if con.isValid() and con.isOpen():
+        query = QSqlQuery("PRAGMA wal_checkpoint(TRUNCATE)", con)
+        query.finish()
+
+
+def open_database(dbfile=None, backup: bool = True):
     """Ensure the connection to the database is open.
     The QtSql default connection is used.
+    If <backup> is false, the monthly backup copy is not made (and not
+    reported) – for temporary data, e.g. in automatic test runs.
     """
     if not dbfile:
         dbfile = DATABASE
     dbpath = DATAPATH(dbfile)
     bupath = DATAPATH(f"BACKUP/{Dates.today().rsplit('-', 1)[0]}_{dbfile}")
-    if not os.path.isfile(bupath):
+    if backup and not os.path.isfile(bupath):
         os.makedirs(os.path.dirname(bupath), exist_ok=True)
+        _checkpoint()
         copyfile(dbpath, bupath)
         REPORT("INFO", T["MONTHLY_DB_BACKUP"].format(path=bupath))
 
@@ -94,7 +209,10 @@ def open_database(dbfile=None):
         if con.databaseName() == dbpath:
             # The connection is already open
             return con
-        # Connected to another db: close it
+        # Connected to another db: close it, the prepared queries
+        # belong to the old connection
+        _QUERY_CACHE.clear()
+        table_changed(None)
         con.close()
         connectionName = con.connectionName()
         con = None  # needed to release the database object
@@ -106,6 +224,7 @@ def open_database(dbfile=None):
     # print("TABLES:", con.tables())
     foreign_keys_on = "PRAGMA foreign_keys = ON"
     assert QSqlQuery(foreign_keys_on).isActive(), f"Failed: {foreign_keys_on}"
+    apply_db_profile(con, db_profile(dbpath))
     return con
 
 
@@ -167,6 +286,7 @@ def db_backup(name=""):
     else:
         stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         newfile = f"{dbpath}_{stamp}"
+    _checkpoint()
     copyfile(dbpath, newfile)
     existing = sorted(glob(dbpath + "_*"))
     msg = [T["BACKUP_TO"].format(f=newfile)]
@@ -228,6 +348,72 @@ class Record:
         return {r.fieldName(i): r.value(i) for i in range(r.count())}
 
 
+def prepared_query(query_text: str) -> QSqlQuery:
+    """Return a prepared query for the given text on the default
+    connection. The values are passed as "?" placeholders, so that
+    queries which differ only in their values share the same prepared
+    query – SQLite only needs to parse and plan it once.
+    The queries are cached (the most recently used <QUERY_CACHE_SIZE>).
+    The values are bound by <db_exec>.
+    """
+    try:
+        query = _QUERY_CACHE.pop(query_text)
+    except KeyError:
+        query = QSqlQuery()
+        if not query.prepare(query_text):
+            error = query.lastError()
+            REPORT(
+                "ERROR", f"SQL query failed: {error.text()}\n  {query_text}"
+            )
+            return query
+        if len(_QUERY_CACHE) >= QUERY_CACHE_SIZE:
+            # Remove the least recently used entry
+            del _QUERY_CACHE[next(iter(_QUERY_CACHE))]
+    # (Re)insert at the end, as most recently used
+    _QUERY_CACHE[query_text] = query
+    return query
+
+
+def db_exec(query_text: str, values: list) -> QSqlQuery:
+    """Execute the (cached) prepared query for <query_text> with the
+    given values for its "?" placeholders.
+    Return the query object, which is active if the execution was
+    successful. The results must be read before the same query text
+    is executed again. When the results are no longer needed,
+    <query.finish()> should be called.
+    """
+    query = prepared_query(query_text)
+    for v in values:
+        query.addBindValue(v)
+    query.exec()
+    return query
+
+
+def _where_clause(wheres, keys) -> tuple[str, list]:
+    """Build a WHERE clause from the conditions <wheres> (strings) and
+    <keys>, which are conditions with "=" (value is str or int) or "IN"
+    (value is list). The values in <keys> are passed as placeholders.
+    Return the clause text and the list of values.
+    """
+    where_cond = [w for w in wheres]
+    values = []
+    for k, v in keys.items():
+        if isinstance(v, (str, int)):
+            where_cond.append(f'"{k}" = ?')
+            values.append(v)
+        elif isinstance(v, list):
+            instring = ", ".join("?" * len(v))
+            where_cond.append(f'"{k}" IN ( {instring} )')
+            values += v
+        else:
+            assert False, (
+                f"Unexpected comparison value: '{repr(v)}' for '{k}'"
+            )
+    if where_cond:
+        return f" WHERE {' AND '.join(where_cond)}", values
+    return "", values
+
+
 def db_select(query_text: str) -> list[Record]:
     query = QSqlQuery(query_text)
     if not query.isActive():
@@ -306,25 +492,7 @@ def db_read_table(
     is list).
     Return a list of fields and a list of records (each is a list).
     """
-    where_cond = [w for w in wheres]
-    for k, v in keys.items():
-        if isinstance(v, str):
-            where_cond.append(f'"{k}" = "{v}"')
-        elif isinstance(v, int):
-            where_cond.append(f'"{k}" = {v}')
-        elif isinstance(v, list):
-            instring = ", ".join(
-                [f'"{_v}"' if isinstance(_v, str) else str(_v) for _v in v]
-            )
-            where_cond.append(f'"{k}" IN ( {instring} )')
-        else:
-            assert False, (
-                f"Unexpected comparison value: '{repr(v)}' for '{k}'"
-            )
-    if where_cond:
-        where_clause = f" WHERE {' AND '.join(where_cond)}"
-    else:
-        where_clause = ""
+    where_clause, values = _where_clause(wheres, keys)
     f = ", ".join([f'"{f}"' for f in fields]) if fields else "*"
     if sort_field:
         __sortlist = [f'"{__f}"' for __f in sort_field.split(',')]
@@ -333,13 +501,14 @@ def db_read_table(
         o = ""
     d = " DISTINCT" if distinct else ""
     qtext = f"SELECT{d} {f} FROM {table}{where_clause}{o}"
-    # print("§§§", qtext)
-    query = QSqlQuery(qtext)
+    # print("§§§", qtext, values)
+    query = db_exec(qtext, values)
     rec = query.record()
     nfields = rec.count()
     value_list = []
     while query.next():
         value_list.append([query.value(i) for i in range(nfields)])
+    query.finish()
     if fields:
         assert (not value_list) or len(fields) == nfields, (
             f"Wrong number of fields in record: {nfields} ≠ {len(fields)}"
@@ -429,39 +598,24 @@ def db_key_value_list(
 
 
 def db_update_fields(table, field_values, *wheres, **keys):
-    where_cond = [w for w in wheres]
-    for k, v in keys.items():
-        if isinstance(v, str):
-            where_cond.append(f'"{k}" = "{v}"')
-        elif isinstance(v, int):
-            where_cond.append(f'"{k}" = {v}')
-        elif isinstance(v, list):
-            instring = ", ".join(
-                [f'"{_v}"' if isinstance(_v, str) else str(_v) for _v in v]
-            )
-            where_cond.append(f'"{k}" IN ( {instring} )')
-        else:
-            assert False, f"Unexpected comparison value: '{repr(v)}'"
-    if where_cond:
-        where_clause = f" WHERE {' AND '.join(where_cond)}"
-    else:
-        where_clause = ""
-
     fields = []
+    values = []
     for f, v in field_values:
-        if isinstance(v, str):
-            fields.append(f'"{f}" = "{v}"')
-        elif isinstance(v, int):
-            fields.append(f'"{f}" = {v}')
+        if isinstance(v, (str, int)):
+            fields.append(f'"{f}" = ?')
+            values.append(v)
         else:
             assert False, f"Unexpected field value: '{repr(v)}' for '{f}'"
-
+    where_clause, wvalues = _where_clause(wheres, keys)
     f = ", ".join(fields)
     qtext = f"UPDATE {table} SET {f}{where_clause}"
-    # print("§§§", qtext)
-    query = QSqlQuery()
-    if query.exec(qtext):
+    # print("§§§", qtext, values + wvalues)
+    query = db_exec(qtext, values + wvalues)
+    if query.isActive():
         n = query.numRowsAffected()
+        query.finish()
+        if n > 0:
+            table_changed(table)
         if n == 1:
             return True
         assert n < 1, f"DB error : {n} rows updated ...\n  {qtext}"
@@ -474,28 +628,31 @@ def db_update_field(table, field, value, *wheres, **keys):
     return db_update_fields(table, [(field, value)], *wheres, **keys)
 
 
-def sql_insert_from_dict(table, field_dict):
+def sql_insert_from_dict(table, field_dict) -> tuple[str, list]:
+    """Return the text of an INSERT query (with "?" placeholders) for
+    the given field values, and the list of values.
+    """
     flist, vlist = [], []
     for f, v in field_dict.items():
         flist.append(f'"{f}"')
-        if isinstance(v, str):
-            vlist.append(f'"{v}"')
-        elif isinstance(v, int):
-            vlist.append(f"{v}")
+        if isinstance(v, (str, int)):
+            vlist.append(v)
         else:
             assert False, f"Unexpected field value: '{repr(v)}' for '{f}'"
     return (
         f"INSERT INTO {table} ({', '.join(flist)})"
-        f" VALUES ({', '.join(vlist)})"
-    )
+        f" VALUES ({', '.join('?' * len(vlist))})"
+    ), vlist
 
 
 def db_new_row(table, **values):
-    qtext = sql_insert_from_dict(table, values)
-    # print("§§§", qtext)
-    query = QSqlQuery()
-    if query.exec(qtext):
+    qtext, vlist = sql_insert_from_dict(table, values)
+    # print("§§§", qtext, vlist)
+    query = db_exec(qtext, vlist)
+    if query.isActive():
         newid = query.lastInsertId()
+        query.finish()
+        table_changed(table)
         # print("-->", newid)
         return newid
     error = query.lastError()
@@ -504,33 +661,115 @@ def db_new_row(table, **values):
 
 
 def db_delete_rows(table, *wheres, **keys):
-    where_cond = [w for w in wheres]
-    for k, v in keys.items():
-        if isinstance(v, str):
-            where_cond.append(f'"{k}" = "{v}"')
-        elif isinstance(v, int):
-            where_cond.append(f'"{k}" = {v}')
-        elif isinstance(v, list):
-            instring = ", ".join(
-                [f'"{_v}"' if isinstance(_v, str) else str(_v) for _v in v]
-            )
-            where_cond.append(f'"{k}" IN ( {instring} )')
-        else:
-            assert False, "Unexpected comparison value: '{repr({v})'"
-    if where_cond:
-        where_clause = f" WHERE {' AND '.join(where_cond)}"
-    else:
-        where_clause = ""
+    where_clause, values = _where_clause(wheres, keys)
     qtext = f"DELETE FROM {table}{where_clause}"
-    # print("§§§", qtext)
-    query = QSqlQuery()
-    if query.exec(qtext):
+    # print("§§§", qtext, values)
+    query = db_exec(qtext, values)
+    if query.isActive():
+        n = query.numRowsAffected()
+        query.finish()
+        if n > 0:
+            table_changed(table)
         return True
     error = query.lastError()
     REPORT("ERROR", error.text())
     return False
 
 
+def _exec_batches(table, batches: list[tuple[str, list[list]]]) -> bool:
+    """Execute the queries on the table, each with a list of value
+    columns (one list for each "?" placeholder), using <execBatch>,
+    all in a single transaction. If one of them fails, the transaction
+    is rolled back.
+    Return <True> if successful.
+    """
+    if not batches:
+        return True
+    con = QSqlDatabase.database()
+    if not con.transaction():
+        REPORT("ERROR", f"SQL transaction failed: {con.lastError().text()}")
+        return False
+    for qtext, columns in batches:
+        query = QSqlQuery(con)
+        if query.prepare(qtext):
+            for col in columns:
+                query.addBindValue(col)
+            if query.execBatch():
+                query.finish()
+                continue
+        error = query.lastError()
+        con.rollback()
+        REPORT("ERROR", f"SQL query failed: {error.text()}\n  {qtext}")
+        return False
+    if con.commit():
+        table_changed(table)
+        return True
+    REPORT("ERROR", f"SQL transaction failed: {con.lastError().text()}")
+    con.rollback()
+    return False
+
+
+def db_bulk_insert(table, rows: list[dict]) -> bool:
+    """Insert the rows (mappings, field -> value) into the table, in a
+    single transaction. Rows with the same fields are inserted with a
+    single prepared query (see <sql_insert_from_dict>).
+    Return <True> if successful, otherwise nothing is changed.
+    """
+    groups = {}
+    for row in rows:
+        fields = tuple(row)
+        try:
+            groups[fields].append(row)
+        except KeyError:
+            groups[fields] = [row]
+    batches = []
+    for fields, rlist in groups.items():
+        qtext, vlist = sql_insert_from_dict(table, rlist[0])
+        batches.append((qtext, [[r[f] for r in rlist] for f in fields]))
+    return _exec_batches(table, batches)
+
+
+def db_bulk_update(
+    table,
+    key_field: str,
+    updates: list[tuple[Union[str, int], list[tuple[str, Union[str, int]]]]],
+) -> bool:
+    """Update many rows of the table, in a single transaction.
+    Each entry in <updates> is a pair: the value of <key_field> for the
+    row and the list of (field, value) pairs to set (as for
+    <db_update_fields>). Rows with the same fields are updated with a
+    single prepared query.
+    Return <True> if successful, otherwise nothing is changed.
+    """
+    groups = {}
+    for key, field_values in updates:
+        fields = tuple(f for f, v in field_values)
+        try:
+            groups[fields].append((key, field_values))
+        except KeyError:
+            groups[fields] = [(key, field_values)]
+    batches = []
+    for fields, ulist in groups.items():
+        f = ", ".join(f'"{f}" = ?' for f in fields)
+        columns = [[fv[i][1] for k, fv in ulist] for i in range(len(fields))]
+        columns.append([k for k, fv in ulist])
+        batches.append((
+            f'UPDATE {table} SET {f} WHERE "{key_field}" = ?',
+            columns
+        ))
+    return _exec_batches(table, batches)
+
+
+def db_bulk_delete(table, key_field: str, keys: list) -> bool:
+    """Delete the rows of the table whose <key_field> values are in
+    <keys>, in a single transaction.
+    Return <True> if successful, otherwise nothing is changed.
+    """
+    return _exec_batches(table, [
+        (f'DELETE FROM {table} WHERE "{key_field}" = ?', [list(keys)])
+    ] if keys else [])
+
+
 """
 # This picks up unique columns, but not unique constraints on multiple columns
 def db_unique_fields(table):
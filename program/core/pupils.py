@@ -1,7 +1,7 @@
 #TODO: This needs migrating from the old WZ code, the local_pupils module
 # is not yet migrated. Not used in timetable, only for reports (NYI).
 """
-core/pupils.py - last updated 2023-08-10
+core/pupils.py - last updated 2026-10-16
 
 Manage pupil data.
 
@@ -42,12 +42,12 @@ from core.db_access import (
     db_read_table,
     db_read_unique_entry,
     NoRecord,
-    db_new_row,
-    db_delete_rows,
-    db_update_fields,
+    db_bulk_insert,
+    db_bulk_update,
+    db_bulk_delete,
 )
 from core.base import class_group_split
-from core.basic_data import SHARED_DATA, get_classes, clear_cache
+from core.basic_data import SHARED_DATA, get_classes, cache_data
 from local.local_pupils import (
     next_class,
     migrate_special,
@@ -93,8 +93,7 @@ def get_pupils(klass, use_cache=True):
         CLASS=klass,
     )[1]:
         pupils.append(dict(zip(field_list, row)))
-    SHARED_DATA[key] = pupils
-    return pupils
+    return cache_data(key, pupils, "PUPILS")
 
 
 def pupils_in_group(class_group, date=None):
@@ -216,23 +215,30 @@ def update_classes(changes):
     calling this function, e.g in the GUI.
     """
     print("\n???????????????????\n", changes)
+    new_rows = []
+    removed = []
+    updates = []
     for d in changes:
         pdata = d[1]
         if d[0] == "NEW":
             #print("\n§§§§§ ADD", pdata)
             # Add to pupils
-            db_new_row("PUPILS", **pdata)
+            new_rows.append(pdata)
         elif d[0] == "REMOVE":
             #print("\n§§§§§ REMOVE", pdata)
             # Remove from pupils
-            db_delete_rows("PUPILS", PID=pdata["PID"])
+            removed.append(pdata["PID"])
         elif d[0] == "DELTA":
             #print("\n§§§§§ UPDATE", pdata, "\n  :::", d[2])
             # Changes field values
-            db_update_fields("PUPILS", d[2], PID=pdata["PID"])
+            updates.append((pdata["PID"], d[2]))
         else:
             raise Bug("Bad delta key: %s" % d[0])
-    clear_cache()
+    # Each kind of change is written in a single transaction
+    db_bulk_delete("PUPILS", "PID", removed)
+    db_bulk_update("PUPILS", "PID", updates)
+    db_bulk_insert("PUPILS", new_rows)
+    # The cached pupil lists are discarded by the write functions
 
 
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
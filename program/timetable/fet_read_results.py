@@ -1,5 +1,5 @@
 """
-timetable/fet_read_results.py - last updated 2023-08-10
+timetable/fet_read_results.py - last updated 2026-10-16
 
 Fetch the placements after a fet run and update the database accordingly.
 There is also a function to generate an aSc-file.
@@ -42,7 +42,7 @@ T = TRANSLATIONS("timetable.fet_read_results")
 
 import xmltodict
 
-from core.db_access import db_backup, db_update_fields
+from core.db_access import db_backup, db_bulk_update
 from ui.ui_base import QFileDialog
 
 ### -----
@@ -86,6 +86,7 @@ def read_placements(fet_file, placement_file):
         xml = fh.read()
     pos_data = xmltodict.parse(xml)
     pos_list = pos_data["Activities_Timetable"]["Activity"]
+    updates = []
     for p in pos_list:
         aid = p["Id"]
         lesson_id = activity2lesson.get(aid)
@@ -100,7 +101,9 @@ def read_placements(fet_file, placement_file):
                 else:
                     field_values.append(("ROOMS", room))
             # print("§§§", lesson_id, field_values)
-            db_update_fields("LESSONS", field_values, lid=int(lesson_id))
+            updates.append((int(lesson_id), field_values))
+    # All the placements are written in a single transaction
+    db_bulk_update("LESSONS", "lid", updates)
 
 
 def getActivities(working_folder):
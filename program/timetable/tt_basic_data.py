@@ -1,7 +1,7 @@
 """
 timetable/tt_basic_data.py
 
-Last updated:  2023-09-20
+Last updated:  2026-10-16
 
 Handle the basic information for timetable display and processing.
 
@@ -38,6 +38,7 @@ T = TRANSLATIONS("timetable.tt_basic_data")
 ### +++++
 
 from typing import NamedTuple, Optional
+from array import array
 
 from core.basic_data import (
     get_days,
@@ -49,7 +50,23 @@ from core.basic_data import (
     GROUP_ALL,
     NO_TEACHER
 )
-from core.db_access import db_select, db_query, db_read_fields
+from core.db_access import (
+    db_select,
+    db_query,
+    db_read_fields,
+    read_pairs,
+)
+from timetable.tt_matching import allowed_choices
+
+# The penalties for breaking constraints with the various weights
+# ('-' means the constraint is not active). Each step roughly doubles
+# the penalty, so that a single breach with a higher weight counts for
+# more than a couple of breaches with the next lower weight. '+' is
+# for "hard" constraints.
+WEIGHT_PENALTY = {
+    '-': 0, '1': 1, '2': 2, '3': 4, '4': 8, '5': 16,
+    '6': 32, '7': 64, '8': 128, '9': 256, '+': 10000
+}
 
 class COURSE_INFO(NamedTuple):
     klass: str
@@ -71,13 +88,14 @@ class TT_LESSON(NamedTuple):
     teachers: list[int]
     classgroups: list[int]
     fixed_rooms: list[int]
-    room_choices: list[list[int]]
+    room_choices: list[list[int]]   # possible rooms for each requirement
     courselist: list[COURSE_INFO]
     lesson_id: int
     subject_tag: str
     length: int
     lesson_group: int
     time: int
+    classbits: list[tuple[int, int]]    # [(class index, atom bitmask), ... ]
     # These are only needed for initialisation
 #TODO: Consider moving the following out of this data structure
     placement0: int
@@ -122,6 +140,49 @@ def get_room_groups():
     return rgroups
 
 
+def get_blocked_slots(available: str, ndays: int, nperiods: int) -> int:
+    """Convert an "availability" string (field AVAILABLE in tables
+    TT_TEACHERS and TT_CLASSES) to a bitmask of blocked time slots. The
+    bit for time slot <t> is <1 << t>, so bit 0 (the null slot) is
+    always clear.
+    The days are separated by '_', each day has a character for each
+    period. Only '-' is blocked. Where a value is missing, the last
+    value for the day is used (initially '+').
+    """
+    day_periods = available.split("_") if available else []
+    mask = 0
+    t = 1
+    for d in range(ndays):
+        try:
+            ddata = day_periods[d]
+        except IndexError:
+            ddata = ""
+        pval = "+"
+        for p in range(nperiods):
+            try:
+                pval = ddata[p]
+            except IndexError:
+                # No value, use last available
+                pass
+            if pval == "-":
+                mask |= 1 << t
+            t += 1
+    return mask
+
+
+def mask2slots(mask: int) -> list[int]:
+    """Return the time slots (indexes) of the set bits of <mask>.
+    """
+    slots = []
+    t = 0
+    while mask:
+        if mask & 1:
+            slots.append(t)
+        mask >>= 1
+        t += 1
+    return slots
+
+
 def get_lg_lessons():
     """Each lesson-group will have one or more classes (though the null
     class is possible, too) and one or more teachers (though the null
@@ -151,7 +212,7 @@ def get_lg_lessons():
 
 
 def simplify_room_lists(roomlists: list[list[int]]
-) -> Optional[tuple[list[int], list[tuple[int, Optional[list]]]]]:
+) -> Optional[tuple[list[int], list[list[int]]]]:
     """Simplify room lists, where possible, and check for room conflicts.
 
     The basic room specifications for the individual "tlessons" are
@@ -167,53 +228,60 @@ def simplify_room_lists(roomlists: list[list[int]]
 
     Return:
         List of required rooms (indexes) where there is no choice.
-        List of possible room-choice vectors (lists).
+        List of the remaining requirements, each a list of the rooms
+        (indexes) which are possible for it.
+
+    The requirement lists are first reduced to the rooms which are
+    possible in some complete allocation (see <allowed_choices>). The
+    requirements and rooms are then split into connected groups (rooms
+    shared by requirements). Where a group has as many rooms as
+    requirements, all its rooms are needed, so they are "fixed".
+    The actual choice is made at placement time, by bipartite matching.
 
     A <None> return value indicates invalid data.
     """
-    results = []
-    used = []
-    selection_sets = set()
-    set0 = set()
     if not roomlists:
         return ([], [])
-    nentries = len(roomlists)
-
-    def rcall():
-        i = len(used)
-        if i < nentries:
-            for r in roomlists[i]:
-                if r not in used:
-                    used.append(r)
-                    rc = rcall()
-                    del used[-1]
-        else:
-            # A possible room list is in <used>.
-            # Skip lists where the set of rooms has already been covered.
-            rs = frozenset(used)
-            if rs not in selection_sets:
-                if results:
-                    set0.intersection_update(rs)
-                else:
-                    set0.update(rs)
-                selection_sets.add(rs)
-                results.append(tuple(used))
-    rcall()
-    if not results:
+    allowed = allowed_choices(roomlists)
+    if allowed is None:
         return None
-#Note: This can produce long, rather inefficient room-choice lists.
-    filtered = []
-    for rl in results:
-        frl = [r for r in rl if r not in set0]
-        #if len(frl) > 1:
-        #    print("$$$$", rl, "-", set0)
-        #    print("  --->", frl)
-        if frl:
-            filtered.append(frl)
-    #if filtered and len(filtered[0]) > 1:
-    #    print("§§§§", results)
-    #    print("  -->", filtered)
-    return (list(set0), filtered)
+    # Find the connected groups (union-find on the requirements, linked
+    # by shared rooms)
+    n = len(allowed)
+    parent = list(range(n))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    r2req = {}
+    for i, rlist in enumerate(allowed):
+        for r in rlist:
+            try:
+                j = r2req[r]
+            except KeyError:
+                r2req[r] = i
+            else:
+                parent[root(i)] = root(j)
+    groups = {}
+    for i in range(n):
+        try:
+            groups[root(i)].append(i)
+        except KeyError:
+            groups[root(i)] = [i]
+    fixed = []
+    choices = []
+    for ilist in groups.values():
+        rooms = set()
+        for i in ilist:
+            rooms.update(allowed[i])
+        if len(rooms) == len(ilist):
+            fixed += sorted(rooms)
+        else:
+            choices += [allowed[i] for i in ilist]
+    return (fixed, choices)
 
 
 class TimetableData:
@@ -239,12 +307,41 @@ class TimetableData:
         "n_class_group_atoms", #: int
         # <n_class_group_atoms> is provided because <class_group_atoms>
         # (being a dict of dicts) doesn't directly provide the needed number.
+        "class_index", #: dict[str, int]
+        "atom_bits", #: list[tuple[int, int]]
+        # Within its class, each atomic group also has a bit, so that the
+        # groups of a class can be handled as a single integer (bitmask).
+        # <class_index> maps the classes to contiguous indexes (NO_CLASS
+        # is 0), <atom_bits> maps the atomic group indexes (as used in
+        # <class_group_atoms>) to (class index, bit) pairs.
         "teacher_index", #: dict[str, int]
         "room_index", #: dict[str, int]
         "room_groups", #: dict[str, list[int]]
         "tt_lessons", #: list[TT_LESSON]
         "class_ttls", #: dict[str, list[int]] (class -> index to <tt_lessons>)
         "teacher_ttls", #: dict[list[int]] (tid -> index to <tt_lessons>)
+        "teacher_blocked", #: list[int] (teacher index -> slot bitmask)
+        "class_blocked", #: dict[str, int] (class -> slot bitmask)
+        "lesson_domains", #: list[int] (index to <tt_lessons> -> slot bitmask)
+        # The "domain" of a lesson is the set of time slots in which it
+        # may start, taking into account its length, the ends of the
+        # days, teacher and class unavailability and fixed times. The
+        # bit for time slot <t> is <1 << t>.
+        "period_tags", #: list[str]
+        "teacher_constraints", #: dict[int, list[tuple[str, str]]]
+        "class_constraints", #: dict[str, list[tuple[str, str]]]
+        # The constraint (key, value) pairs from TT_TEACHERS (key: teacher
+        # index) and TT_CLASSES (key: class), default values ('*')
+        # substituted. With these the constraint objects can be built
+        # without database access (see timetable/tt_penalties.py).
+        "parallels", #: list[tuple[list[int], str]]
+        # The groups of lessons which must start at the same time (index
+        # to <tt_lessons>) with the weight, from PARALLEL_LESSONS.
+        "equivalents", #: list[list[int]]
+        "equivalence", #: list[int] (index to <tt_lessons> -> class, 0: none)
+        # The classes of interchangeable lessons (see <set_equivalents>),
+        # each with the lesson indexes in increasing order. Class 0 is
+        # an empty placeholder.
     )
 
     def period2day_period(self, px):
@@ -261,6 +358,8 @@ class TimetableData:
         c_g_map[NO_CLASS] = {GROUP_ALL: [0]}
         cgi = 0     # Maximum index in <c_g_map>, i.e. number of atomic
                     # groups (valid indexing starts at 1)
+        c_imap = {NO_CLASS: 0}  # { class: class index }
+        a_bits = [(0, 1)]       # [ (class index, atom bit), ... ]
         group_division = {} # { class: }
         for klass, cdata in get_classes().items():
             #print("?", klass)
@@ -284,10 +383,13 @@ class TimetableData:
                             g2div[d] = (i, v)
                     dlist.append(dgas)
                 ## Build atomic group map
+                ci = len(c_imap)
+                c_imap[klass] = ci
                 gmap = {}
                 c_g_map[klass] = gmap
                 amap = {}
                 for ag in cg.atomic_groups:
+                    a_bits.append((ci, 1 << len(amap)))
                     cgi += 1
                     amap[ag] = cgi
                 for g, ags in cg.group_atoms().items():
@@ -296,6 +398,7 @@ class TimetableData:
                 if gmap:
                     gmap[GROUP_ALL] = list(amap.values())
                 else:
+                    a_bits.append((ci, 1))
                     cgi += 1
                     gmap[GROUP_ALL] = [cgi]
                 #print("  gmap:", gmap)
@@ -303,6 +406,8 @@ class TimetableData:
         self.class_room = c_rmap
         self.class_group_atoms = c_g_map
         self.n_class_group_atoms = cgi
+        self.class_index = c_imap
+        self.atom_bits = a_bits
         self.teacher_index = get_teacher_indexes()
         rimap = get_room_map()
         self.room_index = rimap
@@ -335,12 +440,19 @@ class TimetableData:
         period2index = periods.index
         # Run through the lesson groups and their associated lessons
         tt_lessons = [None]
+        lesson_classes = [set()]    # tt_lesson index -> set of classes
         class_activities = {}       # class -> list of tt_lesson indexes
         teacher_activities = {}     # teacher -> list of tt_lesson indexes
         for lg, ll in lg_ll.items():
             ag = lg_map[lg]
             tlist = sorted(ag.teacher_set)
             cglist = sorted(ag.classgroup_set)
+            # Combine the atomic groups to a bitmask for each class
+            cbmap = {}
+            for cg in cglist:
+                ci, b = a_bits[cg]
+                cbmap[ci] = cbmap.get(ci, 0) | b
+            cblist = sorted(cbmap.items())
             tids = set()
             classes = set()
             sid0, bsid0 = None, None
@@ -396,6 +508,7 @@ class TimetableData:
                     rplist = [rimap[r] for r in rr0.split(",")]
                 else:
                     rplist = []
+                lesson_classes.append(classes)
                 tt_lessons.append(TT_LESSON(
                     tt_index,
                     tlist,
@@ -408,12 +521,171 @@ class TimetableData:
                     l,
                     lg,
                     t_index,
+                    cblist,
                     p0_index,
                     rplist
                 ))
         self.tt_lessons = tt_lessons
         self.class_ttls = class_activities
         self.teacher_ttls = teacher_activities
+        self.set_domains(lesson_classes)
+        self.period_tags = [p[0] for p in periods]
+        self.read_constraints()
+        lid2ttl = {ttl.lesson_id: ttl.index for ttl in tt_lessons[1:]}
+        parallels = []
+        for tag, (lids, w) in get_parallels().items():
+            ttlis = [lid2ttl[lid] for lid in lids if lid in lid2ttl]
+            if len(ttlis) > 1:
+                parallels.append((ttlis, w))
+        self.parallels = parallels
+        self.set_equivalents()
+
+    def set_equivalents(self):
+        """Find the classes of interchangeable lessons: those of the same
+        lesson group with the same teachers, groups, rooms, length and
+        domain, which have no fixed time and are not parallel to other
+        lessons. Exchanging the placements of two such lessons produces
+        the same timetable, so a search can ignore such permutations.
+        """
+        in_parallel = set()
+        for ttlis, w in self.parallels:
+            in_parallel.update(ttlis)
+        classes = {}
+        for ttl in self.tt_lessons[1:]:
+            if ttl.time or ttl.index in in_parallel:
+                continue
+            key = (
+                ttl.lesson_group,
+                ttl.length,
+                tuple(ttl.teachers),
+                tuple(ttl.classgroups),
+                tuple(ttl.fixed_rooms),
+                tuple(tuple(rc) for rc in ttl.room_choices),
+                self.lesson_domains[ttl.index],
+            )
+            try:
+                classes[key].append(ttl.index)
+            except KeyError:
+                classes[key] = [ttl.index]
+        equivalents = [[]]
+        equivalence = [0] * len(self.tt_lessons)
+        for ttlis in classes.values():
+            if len(ttlis) > 1:
+                for i in ttlis:
+                    equivalence[i] = len(equivalents)
+                equivalents.append(ttlis)
+        self.equivalents = equivalents
+        self.equivalence = equivalence
+
+    def canonical_placements(self, placements: list[int]) -> list[int]:
+        """Return a copy of the list of time slots (index as
+        <tt_lessons>, 0 = unplaced) in which the slots within each class
+        of interchangeable lessons (see <set_equivalents>) are in
+        increasing order. Placements which differ only by a permutation
+        of interchangeable lessons give the same result.
+        """
+        canonical = list(placements)
+        for ttlis in self.equivalents[1:]:
+            for i, t in zip(ttlis, sorted(placements[i] for i in ttlis)):
+                canonical[i] = t
+        return canonical
+
+    def placement_key(self, placements: list[int]) -> bytes:
+        """Return a compact, hashable key for the placements, the same
+        for placements which differ only by a permutation of
+        interchangeable lessons (see <canonical_placements>).
+        """
+        return bytes(array("H", self.canonical_placements(placements)))
+
+    def set_domains(self, lesson_classes: list[set[str]]):
+        """Build the bitmasks of blocked time slots for the teachers and
+        classes, and from these the "domains" of the lessons – the time
+        slots in which they may start.
+        <lesson_classes> supplies the classes of each lesson (index as
+        <self.tt_lessons>).
+        """
+        ndays = self.days_per_week
+        nperiods = self.periods_per_day
+        t_blocked = [0] * len(self.teacher_index)
+        for tid, available in db_read_fields(
+            "TT_TEACHERS", ("TID", "AVAILABLE")
+        ):
+            try:
+                ti = self.teacher_index[tid]
+            except KeyError:
+                continue
+            t_blocked[ti] = get_blocked_slots(available, ndays, nperiods)
+        self.teacher_blocked = t_blocked
+        c_blocked = {}
+        for klass, available in db_read_fields(
+            "TT_CLASSES", ("CLASS", "AVAILABLE")
+        ):
+            c_blocked[klass] = get_blocked_slots(available, ndays, nperiods)
+        self.class_blocked = c_blocked
+        # For each lesson length, the slots in which a lesson can start
+        # without running over the end of the day.
+        day_starts = {}
+        domains = [0]
+        for ttl in self.tt_lessons[1:]:
+            length = ttl.length
+            try:
+                starts = day_starts[length]
+            except KeyError:
+                starts = 0
+                for d in range(ndays):
+                    for p in range(nperiods - length + 1):
+                        starts |= 1 << (d * nperiods + p + 1)
+                day_starts[length] = starts
+            if ttl.time:
+                # Fixed lessons are not tested for availability
+                domains.append(starts & (1 << ttl.time))
+                continue
+            blocked = 0
+            for ti in ttl.teachers:
+                blocked |= t_blocked[ti]
+            for klass in lesson_classes[ttl.index]:
+                blocked |= c_blocked.get(klass, 0)
+            # A start slot is blocked if any slot covered by the lesson
+            # is blocked.
+            b = blocked
+            for i in range(1, length):
+                b |= blocked >> i
+            domains.append(starts & ~b)
+        self.lesson_domains = domains
+
+    def read_constraints(self):
+        """Read the constraint fields of the tables TT_TEACHERS and
+        TT_CLASSES. The default values are in the TIMETABLE configuration.
+        """
+        TT_CONFIG = MINION(DATAPATH("CONFIG/TIMETABLE"))
+        defaults = {
+            c: d for c, h, d, t in TT_CONFIG["TEACHER_CONSTRAINT_HANDLERS"]
+        }
+        t_constraints = {}
+        for tid, cstr in db_read_fields(
+            "TT_TEACHERS", ("TID", "CONSTRAINTS")
+        ):
+            try:
+                ti = self.teacher_index[tid]
+            except KeyError:
+                continue
+            t_constraints[ti] = [
+                (c, defaults.get(c, v) if v == '*' else v)
+                for c, v in read_pairs(cstr)
+            ]
+        self.teacher_constraints = t_constraints
+        defaults = {
+            c: d for c, h, d, t in TT_CONFIG["CLASS_CONSTRAINT_HANDLERS"]
+        }
+        self.class_constraints = {
+            klass: [
+                (c, defaults.get(c, v) if v == '*' else v)
+                for c, v in read_pairs(cstr)
+            ]
+            for klass, cstr in db_read_fields(
+                "TT_CLASSES", ("CLASS", "CONSTRAINTS")
+            )
+        }
 
     def get_activity_groups(self):
         """Return a mapping of "activity groups" – that is, a collection
@@ -632,6 +904,11 @@ if __name__ == '__main__':
     for tag in sorted(pmap):
         print(f"  // {tag:10} : {pmap[tag]}")
 
+    print("\n LESSON DOMAINS:")
+    for ttl in tt_data.tt_lessons[1:11]:
+        d = tt_data.lesson_domains[ttl.index]
+        print(f"   -- {ttl.lesson_id:4} ({ttl.length}):", mask2slots(d))
+
     print("\n TLESSONS  class 11G:")
     for tli in tt_data.class_ttls["11G"]:
         print("   --", tt_data.tt_lessons[tli])
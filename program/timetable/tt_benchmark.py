@@ -0,0 +1,458 @@
+"""
+timetable/tt_benchmark.py
+
+Last updated:  2026-10-16
+
+Generate reproducible synthetic school data for the timetable code and
+time the main timetable code paths on it.
+
+Usage (from the "program" folder):
+    python timetable/tt_benchmark.py [scale ...]
+<scale> is one of the keys of <SCALES>, the default is all of them.
+The data is built in a temporary folder, which is removed afterwards.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    # The data folder is set up for each synthetic school, see below
+    from core.base import start
+
+#T = TRANSLATIONS("timetable.tt_benchmark")
+
+### +++++
+
+import os
+from random import Random
+from timeit import default_timer as timer
+from typing import NamedTuple
+
+from core.db_access import DATABASE, DatabaseShortAccess
+
+DAYS = ("Mo", "Di", "Mi", "Do", "Fr", "Sa")
+
+# The weekly lessons of each class: subject, number of periods, room
+# kind ("$" is the classroom). The first lesson of a subject with
+# three or more periods is a double lesson.
+CLASS_PLAN = (
+    ("De", 4, "$"),
+    ("Ma", 4, "$"),
+    ("En", 3, "$"),
+    ("Ge", 2, "$"),
+    ("Bi", 2, "Bi"),
+    ("Ph", 2, "Ph"),
+    ("Ku", 2, "Ku"),
+    ("Mu", 1, "Mu"),
+)
+# Sport is taught in divided classes where possible, block courses
+# ("Hw") are shared by two classes.
+SPECIAL_ROOMS = ("Sp", "Ku", "Mu", "Ph", "Ch", "Bi", "Inf")
+
+TEACHER_CONSTRAINTS = (
+    "",
+    "MAXGAPSDAILY:1%5",
+    "MINDAILY:2%+\nMAXBLOCK:4%7",
+    "LUNCHBREAK:4,5%+",
+)
+CLASS_CONSTRAINTS = (
+    "",
+    "MINDAILY:*",
+    "MAXGAPSWEEKLY:2%5\nLUNCHBREAK:4,5%7",
+)
+
+SCHEMA = (
+    "create table TT_DAYS(N integer, TAG text, NAME text)",
+    "create table TT_PERIODS(N integer, TAG text, NAME text)",
+    "create table CLASSES(CLASS text primary key, NAME text,"
+        " CLASSROOM text, DIVISIONS text)",
+    "create table TEACHERS(TID text primary key, FIRSTNAMES text,"
+        " LASTNAME text, SIGNED text, SORTNAME text)",
+    "create table ROOMS(RID text primary key, NAME text)",
+    "create table TT_ROOM_GROUPS(ROOM_GROUP text, RID text)",
+    "create table SUBJECTS(SID text primary key, NAME text, SORTING text)",
+    "create table COURSES(Course integer primary key, CLASS text,"
+        " GRP text, SUBJECT text, TEACHER text, REPORT text default '',"
+        " GRADES text default '', REPORT_SUBJECT text default '',"
+        " AUTHORS text default '', INFO text default '')",
+    "create table PAY_FACTORS(Pay_factor_id integer primary key,"
+        " PAY_TAG text, PAY_WEIGHT text)",
+    "create table LESSON_GROUPS(Lesson_group integer primary key,"
+        " BLOCK_SID text, BLOCK_TAG text, NOTES text)",
+    "create table LESSON_DATA(Lesson_data integer primary key,"
+        " Pay_factor_id integer, PAY_NLESSONS text, ROOM text)",
+    "create table COURSE_LESSONS(Cl_id integer primary key,"
+        " Course integer, Lesson_group integer, Lesson_data integer)",
+    "create table LESSONS(Lid integer primary key, Lesson_group integer,"
+        " LENGTH integer, TIME text, PLACEMENT text, ROOMS text)",
+    "create table PARALLEL_LESSONS(id integer primary key,"
+        " lesson_id integer, TAG text, WEIGHTING text)",
+    "create table TT_CLASSES(CLASS text primary key, AVAILABLE text,"
+        " CONSTRAINTS text)",
+    "create table TT_TEACHERS(TID text primary key, AVAILABLE text,"
+        " CONSTRAINTS text)",
+)
+
+CONFIG_TIMETABLE = """BREAKS_BEFORE_PERIODS: [3 5]
+TEACHER_CONSTRAINT_HANDLERS: [
+    [MINDAILY N_PERIODS 2%+ "min. lessons per day"]
+    [MAXGAPSDAILY N_PERIODS 1%+ "max. gaps per day"]
+    [MAXGAPSWEEKLY N_PERIODS 3%+ "max. gaps per week"]
+    [MAXBLOCK N_PERIODS 4%+ "max. block"]
+    [LUNCHBREAK SELECT_PERIODS 4,5%+ "lunch break"]
+]
+CLASS_CONSTRAINT_HANDLERS: [
+    [MINDAILY N_PERIODS 4%+ "min. lessons per day"]
+    [MAXGAPSWEEKLY N_PERIODS 0%+ "max. gaps per week"]
+    [LUNCHBREAK SELECT_PERIODS 4,5%+ "lunch break"]
+]
+"""
+
+### -----
+
+
+class SCHOOL_PARAMETERS(NamedTuple):
+    n_classes: int
+    n_teachers: int
+    classes_per_room: int   # number of classes sharing a special room
+    divisions: tuple[str, ...]  # DIVISIONS values, chosen at random
+    n_blocks: int           # block courses shared by two classes
+    n_parallels: int        # pairs of parallel ('+') lessons
+    n_fixed: int            # lessons with a fixed time
+    days_per_week: int = 5
+    periods_per_day: int = 8
+    seed: int = 1
+    year: int = 2025        # calendar year in which the school year starts
+
+
+SCALES = {
+    "small": SCHOOL_PARAMETERS(
+        6, 18, 4, ("", "A+B", "A+B;G+R"), 3, 1, 1
+    ),
+    "medium": SCHOOL_PARAMETERS(
+        16, 45, 4, ("", "A+B", "A+B;G+R", "A+B;G+R;X+Y+Z"), 8, 3, 3
+    ),
+    "large": SCHOOL_PARAMETERS(
+        40, 110, 4, ("", "A+B", "A+B;G+R", "A+B;G+R;X+Y+Z"), 20, 8, 6
+    ),
+}
+
+
+def _sql_value(v) -> str:
+    if isinstance(v, str):
+        return "'" + v.replace("'", "''") + "'"
+    return str(v)
+
+
+def _sql_insert(table: str, rows: list[tuple]) -> list[str]:
+    """Return the SQL commands to insert the rows into the table. To
+    keep the number of commands small, each one inserts many rows.
+    """
+    sql = []
+    for i in range(0, len(rows), 500):
+        values = ",".join(
+            "(" + ",".join(_sql_value(v) for v in row) + ")"
+            for row in rows[i:i + 500]
+        )
+        sql.append(f"insert into {table} values {values}")
+    return sql
+
+
+def school_sql(params: SCHOOL_PARAMETERS) -> list[str]:
+    """Return the SQL commands to build a synthetic school with the
+    given parameters. The same parameters always produce the same
+    school.
+    """
+    rng = Random(params.seed)
+    ndays = params.days_per_week
+    nperiods = params.periods_per_day
+    tables = {}
+
+    def add(table, *row):
+        try:
+            tables[table].append(row)
+        except KeyError:
+            tables[table] = [row]
+
+    for i in range(ndays):
+        add("TT_DAYS", i + 1, DAYS[i], DAYS[i])
+    for i in range(nperiods):
+        add("TT_PERIODS", i + 1, str(i + 1), f"{i + 1}. Stunde")
+    subjects = {s for s, n, r in CLASS_PLAN} | {"Sp", "Hw"}
+    for s in sorted(subjects):
+        add("SUBJECTS", s, s, s)
+    add("TEACHERS", "--", "", "keine", "", "")
+    tids = [f"T{i:03}" for i in range(1, params.n_teachers + 1)]
+    for t in tids:
+        add("TEACHERS", t, "Vorname", t, t, t)
+        add(
+            "TT_TEACHERS",
+            t,
+            rng.choice(("", "", "--______", "_+++++---")),
+            rng.choice(TEACHER_CONSTRAINTS),
+        )
+    # Rooms: a classroom for each class, the special rooms are shared
+    n_special = -(-params.n_classes // params.classes_per_room)
+    special = {
+        kind: [f"{kind}{j}" for j in range(1, n_special + 1)]
+        for kind in SPECIAL_ROOMS
+    }
+    for i in range(1, params.n_classes + 1):
+        add("ROOMS", f"r{i:03}", f"Raum {i}")
+    for kind, rlist in special.items():
+        for r in rlist:
+            add("ROOMS", r, r)
+    for kind in ("Ph", "Ch", "Bi"):
+        for r in special[kind]:
+            add("TT_ROOM_GROUPS", "NW", r)
+    # Classes
+    add("CLASSES", "--", "keine Klasse", "", "")
+    # Classes are not available in the last periods of the day
+    day = "+" * (nperiods - 2) + "--"
+    available = "_".join([day] * ndays)
+    classes = []
+    for i in range(1, params.n_classes + 1):
+        k = f"{i:02}K"
+        div = rng.choice(params.divisions)
+        classes.append((k, div))
+        add("CLASSES", k, f"Klasse {i}", f"r{i:03}", div)
+        add("TT_CLASSES", k, available, rng.choice(CLASS_CONSTRAINTS))
+    # Courses and lessons
+    add("PAY_FACTORS", 0, "", "")
+    add("LESSON_GROUPS", 0, "", "", "")
+    add("LESSON_DATA", 0, 0, "0", "")
+    counters = {"lg": 0, "course": 0, "lid": 0}
+    lessons = {}    # subject -> lesson-ids
+
+    def new_lesson_group(bsid=""):
+        counters["lg"] += 1
+        add("LESSON_GROUPS", counters["lg"], bsid, "", "")
+        return counters["lg"]
+
+    def new_course(klass, group, sid, room, lg):
+        counters["course"] += 1
+        course = counters["course"]
+        add("COURSES", course, klass, group, sid, rng.choice(tids),
+            "", "", "", "", "")
+        # LESSON_DATA and COURSE_LESSONS use the same key as COURSES
+        add("LESSON_DATA", course, 0, "0", room)
+        add("COURSE_LESSONS", course, course, lg, course)
+
+    def new_lessons(lg, sid, lengths):
+        for l in lengths:
+            counters["lid"] += 1
+            add("LESSONS", counters["lid"], lg, l, "", "", "")
+            try:
+                lessons[sid].append(counters["lid"])
+            except KeyError:
+                lessons[sid] = [counters["lid"]]
+
+    def rooms(kind):
+        if kind == "$":
+            return "$"
+        rlist = special[kind]
+        if kind in ("Ph", "Bi"):
+            return "/".join(rlist) + "+NW"
+        return "/".join(rlist)
+
+    for k, div in classes:
+        for sid, n, kind in CLASS_PLAN:
+            lg = new_lesson_group()
+            new_course(k, "*", sid, rooms(kind), lg)
+            new_lessons(lg, sid, [2] + [1] * (n - 2) if n >= 3 else [1] * n)
+        lg = new_lesson_group()
+        if "A+B" in div:
+            new_course(k, "A", "Sp", rooms("Sp"), lg)
+            new_course(k, "B", "Sp", rooms("Sp"), lg)
+        else:
+            new_course(k, "*", "Sp", rooms("Sp"), lg)
+        new_lessons(lg, "Sp", [2])
+    hw_rooms = "/".join(special["Ku"] + special["Mu"] + special["Inf"])
+    for i in range(min(params.n_blocks, params.n_classes // 2)):
+        lg = new_lesson_group("Hw")
+        new_course(classes[2 * i][0], "*", "Hw", hw_rooms, lg)
+        new_course(classes[2 * i + 1][0], "*", "Hw", hw_rooms, lg)
+        new_lessons(lg, "Hw", [1, 1])
+    # Parallel lessons: single music lessons of different classes
+    mu = lessons["Mu"]
+    pid = 0
+    for i in range(min(params.n_parallels, len(mu) // 2)):
+        for lid in mu[2 * i:2 * i + 2]:
+            pid += 1
+            add("PARALLEL_LESSONS", pid, lid, f"MU{i + 1}", "+")
+    sql = list(SCHEMA)
+    sql.append("BEGIN TRANSACTION")
+    for table, rows in tables.items():
+        sql += _sql_insert(table, rows)
+    # Fixed times for the first lessons of some history courses
+    for i, lid in enumerate(lessons["Ge"][:params.n_fixed]):
+        d = DAYS[i % ndays]
+        sql.append(f"update LESSONS set TIME = '{d}.{i % 3 + 1}'"
+            f" where Lid = {lid}")
+    sql.append("COMMIT")
+    return sql
+
+
+def make_school(datadir: str, params: SCHOOL_PARAMETERS):
+    """Build a data folder for a synthetic school: the configuration
+    files needed by the timetable code and the database.
+    An existing database in the folder is replaced.
+    The school year is fixed (<params.year>), so that no other data
+    folder is needed.
+    """
+    config = os.path.join(datadir, "CONFIG")
+    os.makedirs(config, exist_ok=True)
+    y = params.year
+    with open(os.path.join(config, "BASE"), "w", encoding="utf-8") as fh:
+        fh.write(
+            "### Base configuration\n"
+            "DECIMAL_SEP: ,\n"
+            "SCHOOLYEAR_MONTH_1: 8\n"
+            "SCHOOL_NAME: \"Synthetische Schule\"\n"
+        )
+    with open(os.path.join(config, "Calendar"), "w", encoding="utf-8") as fh:
+        fh.write(f"FIRST_DAY: {y}-08-01\nLAST_DAY: {y + 1}-07-31\n")
+    with open(os.path.join(config, "TIMETABLE"), "w", encoding="utf-8") as fh:
+        fh.write(CONFIG_TIMETABLE)
+    DatabaseShortAccess.new_database(
+        os.path.join(datadir, DATABASE), school_sql(params)
+    )
+
+
+def time_it(f, repeat: int = 3) -> float:
+    """Return the shortest of <repeat> timings (seconds) of the call
+    <f()>.
+    """
+    best = None
+    for i in range(repeat):
+        start = timer()
+        f()
+        t = timer() - start
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def run_benchmarks(repeat: int = 3) -> list[tuple[str, int, float]]:
+    """Time the main timetable code paths on the current database.
+    Return a list of (name, number of calls, time in seconds).
+    """
+    from core.basic_data import clear_cache
+    from timetable.tt_basic_data import TimetableData
+    from timetable.tt_engine import PlacementEngine
+    from timetable.tt_placement import (
+        load_timetable,
+        critical_constraints,
+        resolve_room_choice,
+        repair_rooms,
+    )
+    from timetable.tt_penalties import PenaltyTracker, get_constraints
+
+    results = []
+
+    def read_data():
+        clear_cache()
+        return TimetableData()
+
+    results.append(("TimetableData()", 1, time_it(read_data, repeat)))
+    tt_data = read_data()
+    # A placement state to load, from the engine's greedy construction
+    # (which only places the times)
+    engine = PlacementEngine(tt_data, seed=1)
+    engine.greedy_fill()
+    repair_rooms(engine.allocation)
+    state = [
+        (t, list(rl)) for t, rl in engine.allocation.allocation_state
+    ]
+    results.append((
+        "load_timetable",
+        1,
+        time_it(lambda: load_timetable(tt_data, state), repeat)
+    ))
+    allocation = load_timetable(tt_data, state)
+    nslots = len(allocation.teacher_weeks)
+    tt_lessons = tt_data.tt_lessons[1:]
+    results.append((
+        "critical_constraints",
+        len(tt_lessons) * (nslots - 1),
+        time_it(
+            lambda: [
+                critical_constraints(allocation, ttl, t)
+                for ttl in tt_lessons
+                for t in range(1, nslots)
+            ],
+            repeat
+        )
+    ))
+    # Room choices in the slots where the lesson would fit (ignoring
+    # its current placement)
+    cases = []
+    for ttl in tt_lessons:
+        if not ttl.room_choices:
+            continue
+        for t in range(1, nslots):
+            if (
+                tt_data.lesson_domains[ttl.index] & (1 << t)
+                and not critical_constraints(allocation, ttl, t)
+            ):
+                cases.append((ttl, t))
+    results.append((
+        "resolve_room_choice",
+        len(cases),
+        time_it(
+            lambda: [
+                resolve_room_choice(allocation, ttl, t)
+                for ttl, t in cases
+            ],
+            repeat
+        )
+    ))
+    tracker = PenaltyTracker(allocation, get_constraints(allocation))
+    results.append((
+        "penalties (full)",
+        len(tracker.constraints) - 1,
+        time_it(tracker.evaluate_all, repeat)
+    ))
+    return results
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    import tempfile, shutil
+    from core.db_access import open_database
+
+    scales = sys.argv[1:] or list(SCALES)
+    for scale in scales:
+        params = SCALES[scale]
+        datadir = tempfile.mkdtemp(prefix=f"wz_{scale}_")
+        try:
+            make_school(datadir, params)
+            start.setup(datadir)
+            # No backup (and no message box): the run is unattended
+            open_database(backup=False)
+            print(f"\n+ {scale}: {params.n_classes} classes,"
+                f" {params.n_teachers} teachers")
+            for name, n, t in run_benchmarks():
+                print(f"  {name:<24} {n:>8} {t:10.5f} s")
+        finally:
+            shutil.rmtree(datadir)
@@ -1,7 +1,7 @@
 """
 timetable/tt_constraints_activities.py
 
-Last updated:  2023-10-01
+Last updated:  2026-10-16
 
 Implementation of the timetable constraints.
 
@@ -37,8 +37,14 @@ if __name__ == "__main__":
 
 ### +++++
 
+from timetable.tt_basic_data import WEIGHT_PENALTY
+
 ### -----
 
+# For incremental evaluation each constraint records what it depends on
+# (see timetable/tt_constraints_participants.py): <teachers>, <groups>
+# and <activities>.
+
 #TODO: Should this really allow previous empty slots?
 class ActivityStartsDay:
     """This constraint checks that the activity is the first lesson of
@@ -46,18 +52,21 @@ class ActivityStartsDay:
     """
     def __init__(self, allocation, aix, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.slots = allocation.group_weeks
         self.groups = tt_data.tt_lessons[aix].classgroups
+        self.teachers = []
+        self.activities = [aix]
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.state = allocation.allocation_state[aix]
 
-    def evaluate():
+    def evaluate(self):
 # This allows preceding free lessons.
         timeslot = self.state[0]
+        if timeslot == 0:
+            return 0
         for i in range((timeslot - 1) % self.ppd):
             timeslot -= 1
             gslots = self.slots[timeslot]
@@ -73,21 +82,24 @@ class ActivityEndsDay:
     """
     def __init__(self, allocation, aix, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.aix = aix
         tt_data = allocation.tt_data
         self.slots = allocation.group_weeks
         self.groups = tt_data.tt_lessons[aix].classgroups
+        self.teachers = []
+        self.activities = [aix]
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.state = allocation.allocation_state[aix]
 
-    def evaluate():
+    def evaluate(self):
         # This is made more complicated by the possibility that the
         # lesson length > 1. I can check for different activities
         # following on the same day.
         timeslot = self.state[0]
+        if timeslot == 0:
+            return 0
         p = (timeslot - 1) % self.ppd
         for i in range((p + 1), self.ppd):
             timeslot += 1
@@ -105,17 +117,19 @@ class ActivitiesNotOnSameDay:
     """
     def __init__(self, allocation, aixlist, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.states = [allocation.allocation_state[i] for i in aixlist]
+        self.teachers = []
+        self.groups = []
+        self.activities = list(aixlist)
 
-    def evaluate():
+    def evaluate(self):
         days = []
         for state in self.states:
-            t = self.states[0]
+            t = state[0]
             if t > 0:
                 d = (t - 1) // self.ppd
                 if d in days:
@@ -135,16 +149,18 @@ class ActivitiesMinDaysBetween:
     """
     def __init__(self, allocation, aix1, aix2, mindays, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.mindays = mindays
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.state1 = allocation.allocation_state[aix1]
         self.state2 = allocation.allocation_state[aix2]
+        self.teachers = []
+        self.groups = []
+        self.activities = [aix1, aix2]
 
-    def evaluate():
+    def evaluate(self):
         t1, t2 = self.state1[0], self.state2[0]
         if (
             t1 > 0
@@ -163,15 +179,17 @@ class ActivityNotAfter:
 # activity?
     def __init__(self, allocation, aix, aix0, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.state = allocation.allocation_state[aix]
         self.state0 = allocation.allocation_state[aix0]
+        self.teachers = []
+        self.groups = []
+        self.activities = [aix, aix0]
 
-    def evaluate():
+    def evaluate(self):
         t, t0 = self.state[0], self.state0[0]
         if t0 > 0 and t > t0:   # <t> after <t0>
             if (t - 1) // self.ppd == (t0 - 1) // self.ppd: # same day
@@ -185,8 +203,7 @@ class ActivitiesMinGap:
     """
     def __init__(self, allocation, aix1, aix2, mingap, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.gap1 = tt_data.tt_lessons[aix1].length + mingap
         self.gap2 = tt_data.tt_lessons[aix2].length + mingap
@@ -194,8 +211,11 @@ class ActivitiesMinGap:
         #self.dpw = tt_data.days_per_week
         self.state1 = allocation.allocation_state[aix1]
         self.state2 = allocation.allocation_state[aix2]
+        self.teachers = []
+        self.groups = []
+        self.activities = [aix1, aix2]
 
-    def evaluate():
+    def evaluate(self):
         t1, t2 = self.state1[0], self.state2[0]
         if t1 > 0 and t2 > 0:
             d1, p1 = divmod((t1 - 1), self.ppd)
@@ -216,16 +236,18 @@ class ActivityPreferredStartingTimes:
     """
     def __init__(self, allocation, aix, times, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.times = times
         self.ppd = tt_data.periods_per_day
         #self.dpw = tt_data.days_per_week
         self.state = allocation.allocation_state[aix]
+        self.teachers = []
+        self.groups = []
+        self.activities = [aix]
 
-    def evaluate():
-        t = self.state1[0]
+    def evaluate(self):
+        t = self.state[0]
         if t > 0 and ((t - 1) % self.ppd not in self.times):
             return self.penalty
         return 0
@@ -236,12 +258,13 @@ class ActivitiesSameStartingTime:
     """
     def __init__(self, allocation, aixlist, weight):
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
-        self.times = times
+        self.penalty = WEIGHT_PENALTY[weight]
         self.states = [allocation.allocation_state[i] for i in aixlist]
+        self.teachers = []
+        self.groups = []
+        self.activities = list(aixlist)
 
-    def evaluate():
+    def evaluate(self):
         t = 0
         for s in self.states:
             tt = s[0]
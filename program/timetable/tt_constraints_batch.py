@@ -0,0 +1,286 @@
+"""
+timetable/tt_constraints_batch.py
+
+Last updated:  2026-10-16
+
+Evaluate the teacher and group constraints (see
+tt_constraints_participants) for all teachers or atomic groups at
+once, using numpy arrays of the whole week.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+#T = TRANSLATIONS("timetable.tt_constraints_batch")
+
+### +++++
+
+import numpy as np
+
+from timetable.tt_constraints_participants import (
+    MaxGaps_Teacher,
+    LunchBreak_Teacher,
+    MinLessonsPerDay_Teacher,
+    MaxLessonsPerDay_Teacher,
+    MaxBlock_Teacher,
+    MaxDaysPerWeek_Teacher,
+)
+
+### -----
+
+# The week metrics are all calculated from an "occupancy" array, a
+# boolean numpy array (resource × day × period), <True> where the
+# resource has an activity. As in the constraint classes, "unavailable"
+# time-slots are not occupied.
+
+
+def occupancy(weeks, days_per_week: int, periods_per_day: int) -> np.ndarray:
+    """Return the occupancy array for the given "weeks" array of an
+    allocation (time slot × resource, see <Allocation>). Slot 0 is
+    not a time slot.
+    """
+    a = np.asarray(weeks)[1:] > 0
+    return a.reshape(
+        days_per_week, periods_per_day, a.shape[1]
+    ).transpose(2, 0, 1)
+
+
+def daily_lessons(occ: np.ndarray) -> np.ndarray:
+    """Return the number of occupied periods (resource × day).
+    """
+    return occ.sum(axis=2)
+
+
+def daily_gaps(occ: np.ndarray) -> np.ndarray:
+    """Return the number of free periods between the first and the last
+    lesson (resource × day). Free periods at the start and end of a
+    day are not gaps.
+    """
+    nperiods = occ.shape[2]
+    n = occ.sum(axis=2)
+    first = occ.argmax(axis=2)
+    last = nperiods - 1 - occ[:, :, ::-1].argmax(axis=2)
+    return np.where(n > 0, last - first + 1 - n, 0)
+
+
+def longest_block(occ: np.ndarray) -> np.ndarray:
+    """Return the length of the longest run of occupied periods
+    (resource × day).
+    """
+    # The running count of occupied periods, less its value at the
+    # last free period, is the length of the current block.
+    c = occ.cumsum(axis=2)
+    reset = np.maximum.accumulate(np.where(occ, 0, c), axis=2)
+    return (c - reset).max(axis=2)
+
+
+def lunch_blocked(occ: np.ndarray, lunch_periods: list[int]) -> np.ndarray:
+    """Return <True> (resource × day) where all of the given periods
+    (0-based) are occupied.
+    """
+    return occ[:, :, lunch_periods].all(axis=2)
+
+
+class ConstraintBatch:
+    """Evaluate a list of constraint objects, grouped by kind, so that
+    each kind needs only a few numpy operations for all teachers and
+    atomic groups. The constraints which are not handled here (e.g.
+    those on activities) are listed in <others>.
+    Only the result of the constraints' <evaluate> methods is
+    reproduced, the objects are only read when the batch is built.
+    """
+    __slots__ = (
+        "allocation", #: Allocation
+        "n_constraints", #: int
+        "others", #: list[int] (constraint indexes)
+        "kinds", #: list[tuple[str, bool, np.ndarray × 4, ... ]]
+    )
+
+    def __init__(self, allocation, constraints: list):
+        """<constraints> is a list of constraint objects, index as
+        <PenaltyTracker.constraints> (entry 0 is ignored).
+        """
+        self.allocation = allocation
+        self.n_constraints = len(constraints)
+        others = []
+        groups = {}
+        for ci in range(1, len(constraints)):
+            c = constraints[ci]
+            teacher = bool(c.teachers)
+            if isinstance(c, MaxGaps_Teacher):
+                key = ("GAPS", teacher)
+                limits = (c.max_gaps_daily, c.max_gaps_weekly)
+            elif isinstance(c, LunchBreak_Teacher):
+                key = ("LUNCH", teacher, tuple(c.lunch_slots))
+                limits = (0, 0)
+            elif isinstance(c, MinLessonsPerDay_Teacher):
+                key = ("MINDAILY", teacher)
+                # A day without lessons always breaks the constraint
+                limits = (max(c.min_lessons_daily, 1), 0)
+            elif isinstance(c, MaxLessonsPerDay_Teacher):
+                key = ("MAXDAILY", teacher)
+                limits = (c.max_lessons_daily, 0)
+            elif isinstance(c, MaxBlock_Teacher):
+                key = ("MAXBLOCK", teacher)
+                limits = (c.max_blocks, 0)
+            elif isinstance(c, MaxDaysPerWeek_Teacher):
+                key = ("MAXDAYS", teacher)
+                limits = (c.max_days, 0)
+            else:
+                others.append(ci)
+                continue
+            try:
+                groups[key].append((ci, c.ix, *limits, c.penalty))
+            except KeyError:
+                groups[key] = [(ci, c.ix, *limits, c.penalty)]
+        self.others = others
+        self.kinds = []
+        for key, clist in groups.items():
+            cis, ixs, l1, l2, pens = zip(*clist)
+            self.kinds.append((
+                key,
+                np.array(cis, dtype=np.intp),
+                np.array(ixs, dtype=np.intp),
+                np.array(l1, dtype=np.int64),
+                np.array(l2, dtype=np.int64),
+                np.array(pens, dtype=np.int64),
+            ))
+
+    def evaluate(self) -> np.ndarray:
+        """Return the penalties of the handled constraints as an array,
+        index as the constraint list passed to the constructor. The
+        entries of the other constraints are 0.
+        """
+        allocation = self.allocation
+        tt_data = allocation.tt_data
+        ndays = tt_data.days_per_week
+        nperiods = tt_data.periods_per_day
+        # The metrics are only calculated when needed, and only once
+        occ = {}
+        metrics = {}
+
+        def metric(name: str, teacher: bool) -> np.ndarray:
+            try:
+                return metrics[name, teacher]
+            except KeyError:
+                pass
+            try:
+                o = occ[teacher]
+            except KeyError:
+                o = occupancy(
+                    allocation.teacher_weeks if teacher
+                    else allocation.group_weeks,
+                    ndays,
+                    nperiods
+                )
+                occ[teacher] = o
+            if name == "LESSONS":
+                m = daily_lessons(o)
+            elif name == "GAPS":
+                m = daily_gaps(o)
+            elif name == "BLOCK":
+                m = longest_block(o)
+            else:
+                m = o
+            metrics[name, teacher] = m
+            return m
+
+        penalties = np.zeros(self.n_constraints, dtype=np.int64)
+        for key, cis, ixs, l1, l2, pens in self.kinds:
+            kind, teacher = key[:2]
+            if kind == "GAPS":
+                g = metric("GAPS", teacher)[ixs]
+                broken = (
+                    (g > l1[:, None]).any(axis=1) | (g.sum(axis=1) > l2)
+                )
+            elif kind == "LUNCH":
+                o = metric("OCCUPANCY", teacher)[ixs]
+                broken = lunch_blocked(o, list(key[2])).any(axis=1)
+            elif kind == "MINDAILY":
+                n = metric("LESSONS", teacher)[ixs]
+                broken = (n < l1[:, None]).any(axis=1)
+            elif kind == "MAXDAILY":
+                n = metric("LESSONS", teacher)[ixs]
+                broken = (n > l1[:, None]).any(axis=1)
+            elif kind == "MAXBLOCK":
+                b = metric("BLOCK", teacher)[ixs]
+                broken = (b > l1[:, None]).any(axis=1)
+            else:   # "MAXDAYS"
+                n = metric("LESSONS", teacher)[ixs]
+                broken = (n > 0).sum(axis=1) > l1
+            penalties[cis] = np.where(broken, pens, 0)
+        return penalties
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from random import Random
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    from timetable.tt_basic_data import TimetableData
+    from timetable.tt_placement import (
+        get_saved_state,
+        load_timetable,
+        lesson_fits,
+        allocate_lesson,
+    )
+    from timetable.tt_penalties import get_constraints
+    open_database()
+
+    tt_data = TimetableData()
+    allocation = load_timetable(tt_data, get_saved_state(tt_data.tt_lessons))
+    # Place all unplaced lessons randomly, where possible
+    rng = Random(0)
+    nslots = len(allocation.teacher_weeks)
+    for ttl in tt_data.tt_lessons[1:]:
+        if allocation.allocation_state[ttl.index][0] == 0:
+            slots = [t for t in range(1, nslots) if lesson_fits(
+                allocation, ttl, t
+            )]
+            if slots:
+                allocate_lesson(allocation, ttl, rng.choice(slots))
+    constraints = [None] + get_constraints(allocation)
+    # Add the constraints which are not (yet) read from the data
+    for ti in range(1, len(tt_data.teacher_index)):
+        constraints.append(MaxLessonsPerDay_Teacher(allocation, ti, 5, "5"))
+        constraints.append(MaxDaysPerWeek_Teacher(allocation, ti, 4, "5"))
+    print(f"\n+ {len(constraints) - 1} constraints")
+    start = timer()
+    plist = [0] + [c.evaluate() for c in constraints[1:]]
+    t1 = timer() - start
+    start = timer()
+    batch = ConstraintBatch(allocation, constraints)
+    t2 = timer() - start
+    start = timer()
+    p = batch.evaluate()
+    t3 = timer() - start
+    for ci in batch.others:
+        p[ci] = plist[ci]
+    assert p.tolist() == plist, "Batch evaluation differs"
+    print(f"  total penalty: {sum(plist)}, {len(batch.others)} not batched")
+    print(f"  one by one: {t1:.5f} s, batched: {t3:.5f} s (setup {t2:.5f} s)")
@@ -1,7 +1,7 @@
 """
 timetable/tt_constraints_participants.py
 
-Last updated:  2023-09-29
+Last updated:  2026-10-16
 
 Implementation of the timetable constraints for student groups and teachers.
 
@@ -40,7 +40,7 @@ if __name__ == "__main__":
 #from typing import NamedTuple, Optional
 
 #from core.basic_data import get_days, get_periods
-#from timetable.tt_basic_data import TT_LESSON
+from timetable.tt_basic_data import WEIGHT_PENALTY
 
 ### -----
 
@@ -63,6 +63,12 @@ if __name__ == "__main__":
 # Would inheritance from a base class <Constraint> help? Or is it
 # enough to provide the <evaluate> method (to adhere to the "interface")?
 
+# For incremental evaluation (see timetable/tt_penalties.py) each
+# constraint also records what it depends on: the attributes <teachers>
+# and <groups> are lists of teacher and atomic-group indexes,
+# <activities> is a list of activity (tt_lesson) indexes. These are set
+# in the <setup> methods.
+
 
 #deprecated?
 class MaxGapsPerDay_Teacher:
@@ -81,8 +87,7 @@ class MaxGapsPerDay_Teacher:
     def __init__(self, allocation, ix, max_gaps, weight):
         self.max_gaps = max_gaps
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -91,8 +96,11 @@ class MaxGapsPerDay_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         for day in range(self.dpw):
@@ -108,7 +116,7 @@ class MaxGapsPerDay_Teacher:
                 if aix > 0:     # (using -1 for hard-blocked slots?)
                     if pending > 0:
                         gaps += pending
-                        if gaps > self.max_gap:
+                        if gaps > self.max_gaps:
                             return self.penalty
                     pending = 0
                 elif pending >= 0:
@@ -119,6 +127,9 @@ class MaxGapsPerDay_Teacher:
 class MaxGapsPerDay_Group(MaxGapsPerDay_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -161,8 +172,7 @@ class MaxGaps_Teacher:
         self.max_gaps_daily = max_gaps_daily
         self.max_gaps_weekly = max_gaps_weekly
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -171,8 +181,11 @@ class MaxGaps_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         wgaps = 0   # weekly gaps
@@ -189,7 +202,8 @@ class MaxGaps_Teacher:
                 if aix > 0:     # (using -1 for hard-blocked slots?)
                     if pending > 0:
                         gaps += pending
-#TODO: Handle constraint-not-set (by means of a large max value?)
+                        # A constraint which is not set can be given a
+                        # max value larger than the number of periods.
                         if gaps > self.max_gaps_daily:
                             return self.penalty
                         wgaps += pending
@@ -204,6 +218,9 @@ class MaxGaps_Teacher:
 class MaxGaps_Group(MaxGaps_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -219,15 +236,18 @@ class LunchBreak_Teacher:
         self.ix = ix # index of the slot-owner to be tested
 #TODO: Rather get the slots from config / db?
         self.lunch_slots = lunch_slots
+        self.weight = weight    # Needed for priority sorting?
+        self.penalty = WEIGHT_PENALTY[weight]
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
         self.dpw = tt_data.days_per_week
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
         self.setup(allocation)
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
     def evaluate(self):
         d = 1
@@ -244,6 +264,9 @@ class LunchBreak_Teacher:
 class LunchBreak_Group(LunchBreak_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -269,8 +292,7 @@ class MinLessonsPerDay_Teacher:
     ):
         self.min_lessons_daily = min_lessons_daily
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -279,8 +301,11 @@ class MinLessonsPerDay_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         for day in range(self.dpw):
@@ -299,6 +324,9 @@ class MinLessonsPerDay_Teacher:
 class MinLessonsPerDay_Group(MinLessonsPerDay_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -324,8 +352,7 @@ class MaxLessonsPerDay_Teacher:
     ):
         self.max_lessons_daily = max_lessons_daily
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -334,8 +361,11 @@ class MaxLessonsPerDay_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         for day in range(self.dpw):
@@ -350,9 +380,12 @@ class MaxLessonsPerDay_Teacher:
         return 0
 
 
-class MaxLessonsPerDay_Group(MinLessonsPerDay_Teacher):
+class MaxLessonsPerDay_Group(MaxLessonsPerDay_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -371,8 +404,7 @@ class MaxBlock_Teacher:
     ):
         self.max_blocks = max_block_length
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -381,8 +413,11 @@ class MaxBlock_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         for day in range(self.dpw):
@@ -398,9 +433,12 @@ class MaxBlock_Teacher:
             d += self.ppd
         return 0
 
-class MaxBlock_Group(MaxGapsPerDay_Teacher):
+class MaxBlock_Group(MaxBlock_Teacher):
     def setup(self, allocation):
         self.slots = allocation.group_weeks
+        self.teachers = []
+        self.groups = [self.ix]
+        self.activities = []
 
 # ... or both could be a subset of a sort of virtual class ...
 
@@ -418,8 +456,7 @@ class MaxDaysPerWeek_Teacher:
     ):
         self.max_days = max_days
         self.weight = weight    # Needed for priority sorting?
-#TODO: Is the penalty a simple mapping from the weight?
-#        self.penalty = ???
+        self.penalty = WEIGHT_PENALTY[weight]
         self.ix = ix # index of the slot-owner to be tested
         tt_data = allocation.tt_data
         self.ppd = tt_data.periods_per_day
@@ -428,8 +465,11 @@ class MaxDaysPerWeek_Teacher:
 
     def setup(self, allocation):
         self.slots = allocation.teacher_weeks
+        self.teachers = [self.ix]
+        self.groups = []
+        self.activities = []
 
-    def evaluate():
+    def evaluate(self):
 # Move self variables to local ones?
         d = 1
         days = 0
@@ -0,0 +1,213 @@
+"""
+timetable/tt_diff.py
+
+Last updated:  2026-10-16
+
+Compare two allocation states of the same timetable data and merge
+the timetable of a class from one state into another.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+#T = TRANSLATIONS("timetable.tt_diff")
+
+### +++++
+
+from typing import NamedTuple
+
+import numpy as np
+
+from timetable.tt_basic_data import TimetableData
+from timetable.tt_placement import LOAD_CONFLICT, load_allocation
+
+### -----
+
+
+class TIMETABLE_DIFF(NamedTuple):
+    moved: list[tuple[int, int, int]]   # (activity, slot A, slot B)
+    rooms: list[tuple[int, list[int], list[int]]]   # (activity, A, B)
+    teacher_slots: dict[int, list[int]] # teacher index -> changed slots
+    class_slots: dict[int, list[int]]   # class index -> changed slots
+
+
+class Incidence:
+    """The cells (time-slot offset, resource) covered by each activity,
+    as flat numpy arrays, so that the "weeks" arrays of an allocation
+    state (see <Allocation>) can be built with a single scatter. This
+    only depends on the timetable data, so it is built once.
+    """
+    __slots__ = (
+        "tt_data", #: TimetableData
+        "n_slots", #: int
+        "teachers", #: tuple[np.ndarray, np.ndarray, np.ndarray]
+        "groups", #: tuple[np.ndarray, np.ndarray, np.ndarray]
+        "atom_class", #: np.ndarray (atom index -> class index)
+    )
+
+    def __init__(self, tt_data: TimetableData):
+        self.tt_data = tt_data
+        self.n_slots = tt_data.days_per_week * tt_data.periods_per_day + 1
+        tlist = ([], [], [])    # activity, offset, teacher
+        glist = ([], [], [])    # activity, offset, atomic group
+        for ttl in tt_data.tt_lessons[1:]:
+            for k in range(ttl.length):
+                for l, ix in (
+                    (tlist, ttl.teachers),
+                    (glist, ttl.classgroups),
+                ):
+                    for i in ix:
+                        l[0].append(ttl.index)
+                        l[1].append(k)
+                        l[2].append(i)
+        self.teachers = tuple(np.array(a, dtype=np.intp) for a in tlist)
+        self.groups = tuple(np.array(a, dtype=np.intp) for a in glist)
+        self.atom_class = np.array(
+            [ci for ci, b in tt_data.atom_bits], dtype=np.intp
+        )
+
+    def weeks(self, slots: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the teacher and group "weeks" arrays (time slot ×
+        resource, the activity index in each cell) for the given time
+        slots (index as <tt_data.tt_lessons>, 0 = unplaced).
+        """
+        tt_data = self.tt_data
+        result = []
+        for (a, k, i), n in (
+            (self.teachers, len(tt_data.teacher_index)),
+            (self.groups, tt_data.n_class_group_atoms + 1),
+        ):
+            weeks = np.zeros((self.n_slots, n), dtype=np.int32)
+            s = slots[a]
+            placed = s != 0
+            weeks[s[placed] + k[placed], i[placed]] = a[placed]
+            result.append(weeks)
+        return tuple(result)
+
+
+def state_slots(state) -> np.ndarray:
+    """Return the time slots of an allocation state as a numpy array.
+    """
+    return np.array([s[0] for s in state], dtype=np.intp)
+
+
+def diff_states(incidence: Incidence, state_a, state_b) -> TIMETABLE_DIFF:
+    """Compare two allocation states (see <Allocation> and
+    <get_saved_state>) of the same timetable data.
+    Return the activities which have moved, those whose (chosen) rooms
+    have changed and, for each teacher and class with changes, the time
+    slots in which its activities differ.
+    """
+    slots_a = state_slots(state_a)
+    slots_b = state_slots(state_b)
+    moved = [
+        (int(i), int(slots_a[i]), int(slots_b[i]))
+        for i in np.flatnonzero(slots_a != slots_b)
+    ]
+    rooms = []
+    for i in range(1, len(slots_a)):
+        ra = sorted(r for r in state_a[i][1] if r)
+        rb = sorted(r for r in state_b[i][1] if r)
+        if ra != rb:
+            rooms.append((i, ra, rb))
+    tw_a, gw_a = incidence.weeks(slots_a)
+    tw_b, gw_b = incidence.weeks(slots_b)
+    teacher_slots = {}
+    t, i = np.nonzero(tw_a != tw_b)
+    for ti in np.unique(i):
+        teacher_slots[int(ti)] = [int(x) for x in t[i == ti]]
+    # The changed atomic groups are collected by class
+    class_slots = {}
+    t, a = np.nonzero(gw_a != gw_b)
+    c = incidence.atom_class[a]
+    for ci in np.unique(c):
+        class_slots[int(ci)] = [int(x) for x in np.unique(t[c == ci])]
+    return TIMETABLE_DIFF(moved, rooms, teacher_slots, class_slots)
+
+
+def merge_class(
+    tt_data: TimetableData,
+    class_index: int,
+    state_a,
+    state_b,
+) -> tuple[list[tuple[int, list[int]]], list[LOAD_CONFLICT]]:
+    """Build a new allocation state with the activities of the given
+    class (index as <tt_data.class_index>) placed as in <state_a> and
+    all other activities as in <state_b>. The activities of the class
+    are placed first, the placements of <state_b> which then clash are
+    reported (see <load_allocation>) and left unplaced.
+    Return the new state and the conflicts.
+    """
+    merged = [(0, [])]
+    first = []
+    for ttl in tt_data.tt_lessons[1:]:
+        i = ttl.index
+        if any(ci == class_index for ci, b in ttl.classbits):
+            merged.append(tuple(state_a[i]))
+            first.append(i)
+        else:
+            merged.append(tuple(state_b[i]))
+    allocation, conflicts = load_allocation(tt_data, merged, first)
+    return (
+        [(t, list(rl)) for t, rl in allocation.allocation_state],
+        conflicts,
+    )
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    from timetable.tt_placement import get_saved_state
+    from timetable.tt_engine import PlacementEngine
+    open_database()
+
+    tt_data = TimetableData()
+    state_a = get_saved_state(tt_data.tt_lessons)
+    engine = PlacementEngine(tt_data, seed=2)
+    engine.run(1.0)
+    state_b = engine.allocation.allocation_state
+    incidence = Incidence(tt_data)
+    start = timer()
+    diff = diff_states(incidence, state_a, state_b)
+    t = timer() - start
+    print(
+        f"\n+ diff: {len(diff.moved)} moved,"
+        f" {len(diff.rooms)} room changes"
+    )
+    print(
+        f"  {len(diff.teacher_slots)} teachers,"
+        f" {len(diff.class_slots)} classes"
+    )
+    print(f"  ... {t:.5f} s")
+    assert not any(diff_states(incidence, state_a, state_a))
+    ci = next(iter(diff.class_slots))
+    merged, conflicts = merge_class(tt_data, ci, state_a, state_b)
+    print(f"+ merge class {ci}: {len(conflicts)} conflicts")
+    d2 = diff_states(incidence, state_a, merged)
+    assert ci not in d2.class_slots
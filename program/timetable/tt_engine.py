@@ -0,0 +1,463 @@
+"""
+timetable/tt_engine.py
+
+Last updated:  2026-10-16
+
+Automatic placement of the activities: a greedy initial fill followed
+by a local search (simulated annealing).
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+#T = TRANSLATIONS("timetable.tt_engine")
+
+### +++++
+
+from typing import NamedTuple, Optional
+from random import Random
+from math import exp
+from time import monotonic
+
+from timetable.tt_basic_data import (
+    TimetableData,
+    TT_LESSON,
+    WEIGHT_PENALTY,
+    mask2slots,
+)
+from timetable.tt_placement import (
+    Allocation,
+    load_allocation,
+    lesson_fits,
+    blocking_lessons,
+    allocate_lesson,
+    deallocate_lesson,
+    undo_changes,
+)
+from timetable.tt_penalties import PenaltyTracker, get_constraints
+from timetable.tt_propagate import propagate_domains
+
+# The penalty for an unplaced activity. It should be larger than the
+# penalty for any likely combination of broken constraints caused by
+# placing a single activity.
+UNPLACED_PENALTY = 100 * WEIGHT_PENALTY['+']
+
+### -----
+
+
+class SEARCH_RESULT(NamedTuple):
+    hard: int       # unplaced activities + broken hard constraints
+    soft: int       # total penalty of the broken soft constraints
+    placements: list[int]   # time slot for each activity, 0 = unplaced
+
+
+class PlacementEngine:
+    """Automatic placement of the activities which don't have fixed
+    times.
+    The units of placement are the activities, except that activities
+    which must start at the same time (parallel tag with weight '+',
+    see <get_parallels>) are combined into a single unit, which is
+    always moved as a whole. Their same-starting-time constraint is
+    thus always satisfied.
+    The units are first placed greedily, the most constrained first,
+    each in the (fitting) time slot with the least penalty.
+    The result is then improved by simulated annealing, the cost being
+    the weighted penalty of the constraints (see <PenaltyTracker>) plus
+    a large penalty for each unplaced activity. The moves are:
+        move: a unit is placed in another (free) slot,
+        swap: two placed units exchange their slots,
+        kick: a unit is placed in a slot, the units blocking it are
+            removed (become unplaced).
+    Rejected moves are reversed using the allocation's journal.
+    Only the "critical constraints" (teachers, groups, fixed rooms) are
+    treated as absolute. Room choices are not handled here, they can
+    be allocated afterwards (see <repair_rooms>).
+    A copy of the lesson domains is first reduced by constraint
+    propagation (see <propagate_domains>), the problems found are kept
+    in <infeasible>. <tt_data> is not changed.
+    The search is deterministic for a given <seed> – as long as the
+    time budget isn't reached.
+    """
+    def __init__(
+        self,
+        tt_data: TimetableData,
+        state: Optional[list[tuple[int, list[int]]]] = None,
+        seed: Optional[int] = None,
+    ):
+        """<state> is an optional list of initial placements (see
+        <load_allocation>).
+        """
+        self.tt_data = tt_data
+        self.rng = Random(seed)
+        # Reduce the domains first, problems found here mean that no
+        # valid timetable is possible
+        self.lesson_domains = list(tt_data.lesson_domains)
+        self.infeasible = propagate_domains(tt_data, self.lesson_domains)
+        # Placements which are not possible are simply left out
+        allocation, conflicts = load_allocation(tt_data, state)
+        self.allocation = allocation
+        constraints = get_constraints(allocation)
+        self.tracker = PenaltyTracker(allocation, constraints)
+        # Indexes of the hard constraints, for the result
+        self.hard_constraints = [
+            ci for ci, c in enumerate(self.tracker.constraints)
+            if ci and c.weight == '+'
+        ]
+        # Build the placement units, a list of activities each
+        tt_lessons = tt_data.tt_lessons
+        unit_of = [None] * len(tt_lessons)
+        for ttlis, w in tt_data.parallels:
+            if w == '+':
+                unit = []
+                for i in ttlis:
+                    u = unit_of[i]
+                    if u is not None:
+                        # Overlapping parallel groups are combined
+                        unit.extend(ttl for ttl in u if ttl not in unit)
+                    elif tt_lessons[i] not in unit:
+                        unit.append(tt_lessons[i])
+                for ttl in unit:
+                    unit_of[ttl.index] = unit
+        # The units which can be moved: no fixed time, non-empty domain.
+        # The domain of a unit is indexed by its first activity.
+        self.domains = [None] * len(tt_lessons)
+        units = []
+        movable = []
+        for ttl in tt_lessons[1:]:
+            unit = unit_of[ttl.index]
+            if unit is None:
+                unit = [ttl]
+                unit_of[ttl.index] = unit
+            elif unit[0] is not ttl:
+                continue
+            units.append(unit)
+            d = -1
+            for m in unit:
+                d &= self.lesson_domains[m.index]
+            slots = mask2slots(d)
+            self.domains[unit[0].index] = slots
+            if slots and not any(m.time for m in unit):
+                movable.append(unit)
+        self.unit_of = unit_of
+        self.movable = movable
+        self.unplaced = [
+            unit for unit in movable
+            if not self.is_placed(unit)
+        ]
+
+    def is_placed(self, unit: list[TT_LESSON]) -> int:
+        """Return the time slot of a unit if all its activities are
+        placed there, otherwise 0.
+        """
+        state = self.allocation.allocation_state
+        t = state[unit[0].index][0]
+        for ttl in unit[1:]:
+            if state[ttl.index][0] != t:
+                return 0
+        return t
+
+    def place_unit(self, unit: list[TT_LESSON], timeslot: int) -> bool:
+        """Place all activities of the unit in the given time slot, if
+        they all fit. Return true if successful, otherwise the
+        allocation is unchanged.
+        """
+        allocation = self.allocation
+        changes = allocation.journal.checkpoint()
+        for ttl in unit:
+            if not lesson_fits(allocation, ttl, timeslot):
+                undo_changes(allocation, changes)
+                return False
+            allocate_lesson(allocation, ttl, timeslot)
+        return True
+
+    def remove_unit(self, unit: list[TT_LESSON]):
+        for ttl in unit:
+            deallocate_lesson(self.allocation, ttl)
+
+    def cost(self) -> int:
+        return (
+            sum(len(u) for u in self.unplaced) * UNPLACED_PENALTY
+            + self.tracker.total()
+        )
+
+    def result(self) -> SEARCH_RESULT:
+        plist = self.tracker.penalties
+        hard = sum(len(u) for u in self.unplaced)
+        hard_penalty = 0
+        for ci in self.hard_constraints:
+            p = plist[ci]
+            if p:
+                hard += 1
+                hard_penalty += p
+        return SEARCH_RESULT(
+            hard,
+            plist[0] - hard_penalty,
+            [s[0] for s in self.allocation.allocation_state],
+        )
+
+    def greedy_fill(self):
+        """Place the unplaced units, the most constrained (fewest
+        possible time slots, most teachers and groups) first. Each
+        unit is placed in the fitting slot with the least penalty.
+        """
+        allocation = self.allocation
+        tracker = self.tracker
+        rng = self.rng
+        pending = sorted(
+            self.unplaced,
+            key=lambda unit: (
+                len(self.domains[unit[0].index]),
+                -sum(len(m.teachers) + len(m.classgroups) for m in unit),
+            )
+        )
+        unplaced = []
+        for unit in pending:
+            best, bestslots = None, []
+            for t in self.domains[unit[0].index]:
+                changes = allocation.journal.checkpoint()
+                if self.place_unit(unit, t):
+                    d = tracker.update(unit)
+                    undo_changes(allocation, changes)
+                    if best is None or d < best:
+                        best, bestslots = d, [t]
+                    elif d == best:
+                        bestslots.append(t)
+            if bestslots:
+                self.place_unit(unit, rng.choice(bestslots))
+                tracker.update(unit)
+            else:
+                unplaced.append(unit)
+        self.unplaced = unplaced
+        allocation.journal.clear()
+
+    def try_move(self) -> Optional[list[TT_LESSON]]:
+        """Move a placed unit to another fitting slot.
+        Return the moved activities, <None> if no move was made.
+        """
+        rng = self.rng
+        unit = rng.choice(self.movable)
+        if not self.is_placed(unit):
+            return None
+        t = rng.choice(self.domains[unit[0].index])
+        if not self.place_unit(unit, t):
+            return None
+        return list(unit)
+
+    def try_swap(self) -> Optional[list[TT_LESSON]]:
+        """Exchange the slots of two placed units.
+        Return the moved activities, <None> if no move was made.
+        """
+        rng = self.rng
+        allocation = self.allocation
+        unit1 = rng.choice(self.movable)
+        unit2 = rng.choice(self.movable)
+        t1 = self.is_placed(unit1)
+        t2 = self.is_placed(unit2)
+        if t1 == 0 or t2 == 0 or t1 == t2:
+            return None
+        # Exchanging interchangeable activities changes nothing
+        e = self.tt_data.equivalence[unit1[0].index]
+        if e and e == self.tt_data.equivalence[unit2[0].index]:
+            return None
+        changes = allocation.journal.checkpoint()
+        self.remove_unit(unit1)
+        self.remove_unit(unit2)
+        if self.place_unit(unit1, t2) and self.place_unit(unit2, t1):
+            return unit1 + unit2
+        undo_changes(allocation, changes)
+        return None
+
+    def try_kick(self) -> Optional[list[TT_LESSON]]:
+        """Place a unit (preferably an unplaced one) in a slot of its
+        domain, removing the units which block it.
+        Return the moved activities, <None> if no move was made.
+        """
+        rng = self.rng
+        allocation = self.allocation
+        if self.unplaced:
+            unit = rng.choice(self.unplaced)
+        else:
+            unit = rng.choice(self.movable)
+        t = rng.choice(self.domains[unit[0].index])
+        blocking = []
+        for ttl in unit:
+            for i in blocking_lessons(allocation, ttl, t):
+                b = self.unit_of[i]
+                if b is unit:
+                    continue
+                if any(m.time for m in b):
+                    return None     # Fixed activities are not removed
+                if b not in blocking:
+                    blocking.append(b)
+        changes = allocation.journal.checkpoint()
+        moved = list(unit)
+        for b in blocking:
+            self.remove_unit(b)
+            moved += b
+        if not self.place_unit(unit, t):
+            # Only possible with inconsistent units
+            undo_changes(allocation, changes)
+            return None
+        return moved
+
+    def anneal(
+        self,
+        time_limit: float,
+        t_start: float = 100.0,
+        t_end: float = 0.5,
+        max_steps: int = 0,
+    ) -> SEARCH_RESULT:
+        """Improve the current placements by simulated annealing within
+        the time budget (seconds), or with at most <max_steps> steps if
+        this is not 0. If <time_limit> is not positive, there is no time
+        budget, only the step limit, which gives a deterministic run.
+        The temperature falls geometrically from <t_start> to <t_end>.
+        The best placements found are restored at the end and their
+        result returned.
+        """
+        if time_limit <= 0 and not max_steps:
+            raise Bug("Annealing needs a time limit or a step limit")
+        rng = self.rng
+        allocation = self.allocation
+        tracker = self.tracker
+        journal = allocation.journal
+        state = allocation.allocation_state
+        unit_of = self.unit_of
+        journal.clear()
+        cost = self.cost()
+        best_cost = cost
+        best = [s[0] for s in state]
+        start = monotonic()
+        ratio = t_end / t_start
+        temperature = t_start
+        step = 0
+        while True:
+            step += 1
+            if step & 0xff == 0:
+                f = (
+                    (monotonic() - start) / time_limit
+                    if time_limit > 0 else 0.0
+                )
+                if max_steps:
+                    f = max(f, step / max_steps)
+                if f >= 1.0:
+                    break
+                temperature = t_start * ratio ** f
+            elif max_steps and step > max_steps:
+                break
+            r = rng.random()
+            if self.unplaced and r < 0.3 or r < 0.1:
+                moved = self.try_kick()
+            elif r < 0.75:
+                moved = self.try_move()
+            else:
+                moved = self.try_swap()
+            if not moved:
+                continue
+            # The unplaced units can only change by a kick
+            n_unplaced = sum(len(u) for u in self.unplaced)
+            unplaced = [
+                unit for unit in self.unplaced
+                if not self.is_placed(unit)
+            ]
+            for ttl in moved:
+                unit = unit_of[ttl.index]
+                if (
+                    unit[0] is ttl
+                    and not self.is_placed(unit)
+                    and all(u is not unit for u in unplaced)
+                ):
+                    unplaced.append(unit)
+            delta = (
+                tracker.update(moved)
+                + (sum(len(u) for u in unplaced) - n_unplaced)
+                * UNPLACED_PENALTY
+            )
+            if delta <= 0 or rng.random() < exp(-delta / temperature):
+                journal.clear()
+                self.unplaced = unplaced
+                cost += delta
+                if cost < best_cost:
+                    best_cost = cost
+                    best = [s[0] for s in state]
+            else:
+                undo_changes(allocation, 0)
+        self.set_placements(best)
+        return self.result()
+
+    def set_placements(self, placements: list[int]):
+        """Place the movable units according to the given list of time
+        slots (index as <tt_data.tt_lessons>, 0 = unplaced). The slot
+        of the first activity of a unit is used for the whole unit.
+        """
+        allocation = self.allocation
+        for unit in self.movable:
+            self.remove_unit(unit)
+        unplaced = []
+        for unit in self.movable:
+            t = placements[unit[0].index]
+            if not (t and self.place_unit(unit, t)):
+                unplaced.append(unit)
+        allocation.journal.clear()
+        self.unplaced = unplaced
+        self.tracker.evaluate_all()
+
+    def run(self, time_limit: float, max_steps: int = 0) -> SEARCH_RESULT:
+        """Greedy fill followed by annealing for the rest of the time
+        budget (seconds). See <anneal> for the limits.
+        """
+        start = monotonic()
+        self.greedy_fill()
+        if time_limit > 0:
+            time_limit = max(time_limit - (monotonic() - start), 0.1)
+        return self.anneal(time_limit, max_steps=max_steps)
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from core.db_access import open_database
+    from timetable.tt_placement import get_saved_state
+    open_database()
+
+    tt_data = TimetableData()
+    domains0 = list(tt_data.lesson_domains)
+    engine = PlacementEngine(tt_data, seed=1)
+    assert tt_data.lesson_domains == domains0, "<tt_data> changed"
+    if engine.infeasible:
+        print("\n!!! No valid timetable possible:", engine.infeasible)
+    print("\n+ initial cost:", engine.cost(), f"({len(engine.unplaced)} unplaced)")
+    engine.greedy_fill()
+    print("+ after greedy fill:", engine.cost(), engine.result()[:2])
+    res = engine.anneal(10.0)
+    print("+ after annealing:", engine.cost(), res[:2])
+    # Check the cached penalties
+    assert engine.tracker.total() == engine.tracker.evaluate_all()
+    # The parallel activities start together
+    for ttlis, w in tt_data.parallels:
+        if w == '+':
+            assert len({res.placements[i] for i in ttlis}) == 1
@@ -0,0 +1,169 @@
+"""
+timetable/tt_matching.py
+
+Last updated:  2026-10-16
+
+Maximum bipartite matching (Hopcroft-Karp), used for allocating rooms
+to room requirements with choices.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+### +++++
+
+from typing import Optional
+
+INFINITY = 1 << 30
+
+### -----
+
+
+def max_matching(
+    choices: list[list[int]],
+    match: Optional[list[int]] = None,
+) -> tuple[int, list[int]]:
+    """Find a maximum matching of "requirements" to "rooms" using the
+    algorithm of Hopcroft and Karp.
+    <choices> has an entry for each requirement: a list of the
+    acceptable rooms. The rooms are represented by non-zero integers
+    (room indexes), they need not be contiguous.
+    <match> is an optional initial (partial) matching, a list with an
+    entry for each requirement, the room or 0. Entries which are not
+    valid (room not acceptable or used twice) are ignored.
+    Return the size of the matching and a list with the room for each
+    requirement, 0 for an unmatched requirement.
+    """
+    n = len(choices)
+    match_l = [0] * n   # requirement -> room
+    match_r = {}        # room -> requirement
+    if match:
+        for i, r in enumerate(match):
+            if r and r not in match_r and r in choices[i]:
+                match_l[i] = r
+                match_r[r] = i
+    dist = [0] * n
+
+    def bfs() -> bool:
+        """Build the layers of alternating paths starting from the
+        unmatched requirements. Return true if an augmenting path
+        exists.
+        """
+        queue = []
+        for i in range(n):
+            if match_l[i] == 0:
+                dist[i] = 0
+                queue.append(i)
+            else:
+                dist[i] = INFINITY
+        found = False
+        for i in queue:     # <queue> grows during the iteration
+            d = dist[i] + 1
+            for r in choices[i]:
+                j = match_r.get(r)
+                if j is None:
+                    found = True
+                elif dist[j] == INFINITY:
+                    dist[j] = d
+                    queue.append(j)
+        return found
+
+    def dfs(i: int) -> bool:
+        """Seek an augmenting path from requirement <i> along the
+        layers, flipping it if found.
+        """
+        d = dist[i] + 1
+        for r in choices[i]:
+            j = match_r.get(r)
+            if j is None or (dist[j] == d and dfs(j)):
+                match_l[i] = r
+                match_r[r] = i
+                return True
+        dist[i] = INFINITY
+        return False
+
+    size = len(match_r)
+    while size < n and bfs():
+        for i in range(n):
+            if match_l[i] == 0 and dfs(i):
+                size += 1
+    return size, match_l
+
+
+def allowed_choices(choices: list[list[int]]) -> Optional[list[list[int]]]:
+    """Reduce each requirement's list of rooms to those which it can
+    take in some complete matching (one where all requirements have a
+    room).
+    Return <None> if there is no complete matching.
+    """
+    n = len(choices)
+    if max_matching(choices)[0] < n:
+        return None
+    allowed = []
+    for i, rlist in enumerate(choices):
+        alist = []
+        for r in rlist:
+            others = [
+                [x for x in choices[j] if x != r]
+                for j in range(n) if j != i
+            ]
+            if max_matching(others)[0] == n - 1:
+                alist.append(r)
+        allowed.append(alist)
+    return allowed
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from random import Random
+    from itertools import permutations
+    from timeit import default_timer as timer
+
+    print("\n+ matching tests")
+    for choices in (
+        [[1, 2, 3], [1], [1, 2]],
+        [[1, 2], [1, 2], [1, 2]],
+        [[4, 5], [5], [4, 6], [6]],
+        [],
+    ):
+        print(" ", choices, "->", max_matching(choices))
+
+    # Compare with brute force
+    rng = Random(0)
+    for k in range(200):
+        n = rng.randint(1, 5)
+        choices = [
+            rng.sample(range(1, 8), rng.randint(1, 4)) for i in range(n)
+        ]
+        size, m = max_matching(choices)
+        best = 0
+        rooms = list(range(1, 8)) + [0] * n
+        for p in set(permutations(rooms, n)):
+            best = max(best, sum(
+                1 for i, r in enumerate(p) if r and r in choices[i]
+            ))
+        assert size == best, (choices, size, best)
+        assert size == sum(1 for r in m if r)
+        assert len(set(r for r in m if r)) == size
+    print("  random tests against brute force: ok")
+
+    choices = [rng.sample(range(1, 400), 20) for i in range(200)]
+    start = timer()
+    size, m = max_matching(choices)
+    print(f"  200 requirements, 400 rooms: {size} in {timer() - start:.4f} s")
@@ -0,0 +1,177 @@
+"""
+timetable/tt_parallel.py
+
+Last updated:  2026-10-16
+
+Run several independent (seeded) automatic placement searches in
+parallel processes and keep the best result.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+# Sets up the builtins (TRANSLATIONS, REPORT, etc.), also in the
+# worker processes
+import core.base
+
+#T = TRANSLATIONS("timetable.tt_parallel")
+
+### +++++
+
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# The worker processes are started "fresh" (not forked from a process
+# which might be running Qt). The timetable modules need the data
+# folder to be set up (CONFIG, etc.), so they may only be imported
+# after <_init_worker> has run – here they are imported within the
+# functions.
+
+### -----
+
+# Data for the searches in a worker process, set by <_init_worker>
+_WORKER_DATA = None
+
+
+def _init_worker(datadir: str, data: bytes):
+    """Set up the data folder in a worker process, then unpickle the
+    search data (<TimetableData> and initial state).
+    """
+    global _WORKER_DATA
+    core.base.start.setup(datadir)
+    _WORKER_DATA = pickle.loads(data)
+
+
+def _search(seed: int, time_limit: float) -> tuple[int, "SEARCH_RESULT"]:
+    from timetable.tt_engine import PlacementEngine
+    tt_data, state = _WORKER_DATA
+    engine = PlacementEngine(tt_data, state, seed=seed)
+    return seed, engine.run(time_limit)
+
+
+def parallel_search(
+    tt_data: "TimetableData",
+    seeds: list[int],
+    time_limit: float,
+    state: Optional[list[tuple[int, list[int]]]] = None,
+    processes: Optional[int] = None,
+) -> list[tuple[int, "SEARCH_RESULT"]]:
+    """Run a <PlacementEngine> search for each of the <seeds>, each
+    with the time budget <time_limit> (seconds), in a pool of worker
+    processes (default: one per processor).
+    <tt_data> is passed (pickled) to each worker once, it contains no
+    Qt objects, so the workers need no database access, but they do
+    need the data folder (configuration). <state> is an
+    optional list of initial placements (see <load_allocation>).
+    Return a list of (seed, result) pairs, the best first – ordered by
+    the number of hard violations, then by the soft penalty. Results
+    which are the same timetable as a better one (apart from the order
+    of interchangeable lessons, see <placement_key>) are dropped.
+    """
+    with ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(DATAPATH(""), pickle.dumps((tt_data, state))),
+    ) as executor:
+        results = list(
+            executor.map(_search, seeds, [time_limit] * len(seeds))
+        )
+    results.sort(key=lambda sr: (sr[1].hard, sr[1].soft))
+    keys = set()
+    unique = []
+    for sr in results:
+        key = tt_data.placement_key(sr[1].placements)
+        if key not in keys:
+            keys.add(key)
+            unique.append(sr)
+    return unique
+
+
+def best_state(
+    tt_data: "TimetableData",
+    result: "SEARCH_RESULT",
+) -> list[list[int, list[int]]]:
+    """Rebuild the allocation state (see <Allocation>) for the given
+    search result, so that it can be saved. The room choices are
+    allocated jointly for each time slot (see <repair_rooms>).
+    """
+    from timetable.tt_engine import PlacementEngine
+    from timetable.tt_placement import repair_rooms
+    engine = PlacementEngine(tt_data)
+    engine.set_placements(result.placements)
+    allocation = engine.allocation
+    repair_rooms(allocation)
+    allocation.journal.clear()
+    return allocation.allocation_state
+
+
+def search_and_save(
+    tt_data: "TimetableData",
+    seeds: list[int],
+    time_limit: float,
+    state: Optional[list[tuple[int, list[int]]]] = None,
+    processes: Optional[int] = None,
+) -> Optional[list[tuple[int, "SEARCH_RESULT"]]]:
+    """Run the searches (see <parallel_search>) and write the best
+    result to the database (see <save_state>).
+    Return the list of (seed, result) pairs, the best first, <None> if
+    saving failed.
+    """
+    from timetable.tt_placement import save_state
+    results = parallel_search(tt_data, seeds, time_limit, state, processes)
+    if save_state(tt_data, best_state(tt_data, results[0][1])):
+        return results
+    return None
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    from timetable.tt_basic_data import TimetableData
+    from timetable.tt_placement import get_saved_state
+    open_database()
+
+    tt_data = TimetableData()
+    nprocs = os.cpu_count()
+    print(f"\n+ {nprocs} searches in parallel")
+    start = timer()
+    results = search_and_save(tt_data, list(range(nprocs)), 5.0)
+    print(f"  ... {timer() - start:.1f} s")
+    assert results, "Saving the timetable failed"
+    for seed, res in results:
+        print(f"  seed {seed}: hard = {res.hard}, soft = {res.soft}")
+    # The saved placements are those of the best result
+    saved = get_saved_state(TimetableData().tt_lessons)
+    assert [t for t, r in saved] == results[0][1].placements, (
+        "Saved state differs"
+    )
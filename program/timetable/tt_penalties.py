@@ -0,0 +1,365 @@
+"""
+timetable/tt_penalties.py
+
+Last updated:  2026-10-16
+
+Incremental evaluation of the (soft) timetable constraints.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+T = TRANSLATIONS("timetable.tt_penalties")
+
+### +++++
+
+from timetable.tt_basic_data import TT_LESSON, WEIGHT_PENALTY
+from timetable.tt_placement import (
+    Allocation,
+    allocate_lesson,
+    undo_changes,
+)
+from timetable.tt_constraints_participants import (
+    MaxGaps_Teacher,
+    MaxGaps_Group,
+    LunchBreak_Teacher,
+    LunchBreak_Group,
+    MinLessonsPerDay_Teacher,
+    MinLessonsPerDay_Group,
+    MaxBlock_Teacher,
+)
+from timetable.tt_constraints_activities import ActivitiesNotOnSameDay
+from timetable.tt_constraints_batch import ConstraintBatch
+
+# Used as maximum value for constraints which are not set
+NO_LIMIT = 1000
+
+### -----
+
+
+class PenaltyTracker:
+    """Keep the penalties of the individual constraints, so that after
+    a change to the allocation only the constraints which depend on
+    the moved activities need to be evaluated again.
+    The constraints are indexed by the teachers, atomic groups and
+    activities they depend on (see their attributes <teachers>,
+    <groups> and <activities>). Moving an activity can only change the
+    penalties of the constraints indexed by that activity, its teachers
+    or its groups.
+    The penalties are stored in a list, index as <constraints>. Entry
+    0 – there is no constraint 0 – holds the total. Changes to the list
+    are recorded in the allocation's journal, so that <undo_changes>
+    also restores the penalties.
+    """
+    __slots__ = (
+        "allocation", #: Allocation
+        "constraints", #: list[constraint object] (entry 0 is <None>)
+        "penalties", #: list[int] (entry 0 is the total)
+        "teacher_map", #: list[list[int]] (teacher index -> constraints)
+        "group_map", #: list[list[int]] (atom index -> constraints)
+        "activity_map", #: list[list[int]] (activity index -> constraints)
+        "batch", #: ConstraintBatch
+    )
+
+    def __init__(self, allocation: Allocation, constraints: list):
+        self.allocation = allocation
+        tt_data = allocation.tt_data
+        tmap = [[] for i in range(len(tt_data.teacher_index))]
+        gmap = [[] for i in range(tt_data.n_class_group_atoms + 1)]
+        amap = [[] for i in range(len(tt_data.tt_lessons))]
+        clist = [None]
+        for c in constraints:
+            ci = len(clist)
+            clist.append(c)
+            for i in c.teachers:
+                tmap[i].append(ci)
+            for i in c.groups:
+                gmap[i].append(ci)
+            for i in c.activities:
+                amap[i].append(ci)
+        self.constraints = clist
+        self.teacher_map = tmap
+        self.group_map = gmap
+        self.activity_map = amap
+        self.penalties = [0] * len(clist)
+        self.batch = ConstraintBatch(allocation, clist)
+        self.evaluate_all()
+
+    def evaluate_all(self) -> int:
+        """Evaluate all constraints from scratch, return the total
+        penalty. This is not recorded in the journal.
+        The teacher and group constraints are evaluated together (see
+        <ConstraintBatch>), the others one by one.
+        """
+        plist = self.batch.evaluate().tolist()
+        for ci in self.batch.others:
+            plist[ci] = self.constraints[ci].evaluate()
+        total = sum(plist)
+        plist[0] = total
+        # The list object is kept, the journal may refer to it
+        self.penalties[:] = plist
+        return total
+
+    def total(self) -> int:
+        return self.penalties[0]
+
+    def dependents(self, tt_lessons: list[TT_LESSON]) -> set[int]:
+        """Return the indexes of the constraints whose penalties can be
+        changed by moving the given activities.
+        """
+        cset = set()
+        tmap = self.teacher_map
+        gmap = self.group_map
+        amap = self.activity_map
+        for ttl in tt_lessons:
+            cset.update(amap[ttl.index])
+            for i in ttl.teachers:
+                cset.update(tmap[i])
+            for i in ttl.classgroups:
+                cset.update(gmap[i])
+        return cset
+
+    def update(self, tt_lessons: list[TT_LESSON]) -> int:
+        """Re-evaluate the constraints which depend on the given
+        activities after these have been moved (placed, removed).
+        Return the change in the total penalty.
+        """
+        plist = self.penalties
+        clist = self.constraints
+        setp = self.allocation.journal.set
+        delta = 0
+        for ci in self.dependents(tt_lessons):
+            p = clist[ci].evaluate()
+            d = p - plist[ci]
+            if d:
+                delta += d
+                setp(plist, ci, p)
+        if delta:
+            setp(plist, 0, plist[0] + delta)
+        return delta
+
+    def move_delta(self, tt_lesson: TT_LESSON, timeslot: int) -> int:
+        """Return the change in the total penalty which would be caused
+        by placing the activity in the given time slot. The allocation
+        is left unchanged. The placement must be possible (see
+        <lesson_fits>).
+        """
+        changes = allocate_lesson(self.allocation, tt_lesson, timeslot)
+        delta = self.update((tt_lesson,))
+        undo_changes(self.allocation, changes)
+        return delta
+
+
+def read_nperiods(val: str) -> tuple[int, str]:
+    """Read a constraint value of the form "n%w", n being a number of
+    periods and w the weight. Raise <ValueError> if it is not valid.
+    """
+    n, w = val.split('%', 1)
+    if w not in WEIGHT_PENALTY:
+        raise ValueError
+    return int(n), w
+
+
+def read_lunchbreak(val: str, period2index) -> tuple[list[int], str]:
+    """Read a lunch-break constraint value of the form "p1,p2,...%w",
+    p1, etc., being period tags and w the weight. Return a list of
+    period indexes (0-based) and the weight. Raise <ValueError> if the
+    value is not valid.
+    """
+    plist, w = val.split('%', 1)
+    if w not in WEIGHT_PENALTY:
+        raise ValueError
+    return [period2index(p) for p in plist.split(',')], w
+
+
+def get_constraints(allocation: Allocation) -> list:
+    """Build the constraint objects for the teachers (TT_TEACHERS),
+    the classes (TT_CLASSES) and the activities of each lesson group
+    (not on the same day).
+    The constraint values are taken from the <TimetableData> object,
+    there is no database access here.
+    """
+    tt_data = allocation.tt_data
+    period2index = tt_data.period_tags.index
+    constraints = []
+
+    ## Teachers
+    tid_list = list(tt_data.teacher_index)
+    for ti, cvlist in tt_data.teacher_constraints.items():
+        tid = tid_list[ti]
+        for c, v in cvlist:
+            try:
+                if c == "LUNCHBREAK":
+                    plist, w = read_lunchbreak(v, period2index)
+                    if w != '-':
+                        constraints.append(
+                            LunchBreak_Teacher(allocation, ti, plist, w)
+                        )
+                    continue
+                n, w = read_nperiods(v)
+            except ValueError:
+                REPORT(
+                    "ERROR",
+                    T["INVALID_TID_CONSTRAINT"].format(tid=tid, c=c, val=v)
+                )
+                continue
+            if w == '-':
+                continue
+            if c == "MINDAILY":
+                constraints.append(
+                    MinLessonsPerDay_Teacher(allocation, ti, n, w)
+                )
+            elif c == "MAXGAPSDAILY":
+                constraints.append(
+                    MaxGaps_Teacher(allocation, ti, n, NO_LIMIT, w)
+                )
+            elif c == "MAXGAPSWEEKLY":
+                constraints.append(
+                    MaxGaps_Teacher(allocation, ti, NO_LIMIT, n, w)
+                )
+            elif c == "MAXBLOCK":
+                constraints.append(MaxBlock_Teacher(allocation, ti, n, w))
+#TODO: Other constraints are not (yet?) handled here.
+
+    ## Classes: each constraint applies to every atomic group
+    class_atoms = {}
+    for ai, (ci, b) in enumerate(tt_data.atom_bits):
+        if ai:
+            try:
+                class_atoms[ci].append(ai)
+            except KeyError:
+                class_atoms[ci] = [ai]
+    for klass, cvlist in tt_data.class_constraints.items():
+        try:
+            atoms = class_atoms[tt_data.class_index[klass]]
+        except KeyError:
+            continue
+        for c, v in cvlist:
+            try:
+                if c == "LUNCHBREAK":
+                    plist, w = read_lunchbreak(v, period2index)
+                    if w != '-':
+                        for ai in atoms:
+                            constraints.append(
+                                LunchBreak_Group(allocation, ai, plist, w)
+                            )
+                    continue
+#TODO: PAIRGAP and NOTAFTER (subject pairs) are not yet handled here.
+                if c not in ("MINDAILY", "MAXGAPSWEEKLY"):
+                    continue
+                n, w = read_nperiods(v)
+            except ValueError:
+                REPORT(
+                    "ERROR",
+                    T["INVALID_CLASS_CONSTRAINT"].format(
+                        klass=klass, c=c, val=v
+                    )
+                )
+                continue
+            if w == '-':
+                continue
+            for ai in atoms:
+                if c == "MINDAILY":
+                    constraints.append(
+                        MinLessonsPerDay_Group(allocation, ai, n, w)
+                    )
+                else:
+                    constraints.append(
+                        MaxGaps_Group(allocation, ai, NO_LIMIT, n, w)
+                    )
+
+    ## The lessons of a lesson group should be on different days
+    lg_lessons = {}
+    for ttl in tt_data.tt_lessons[1:]:
+        try:
+            lg_lessons[ttl.lesson_group].append(ttl.index)
+        except KeyError:
+            lg_lessons[ttl.lesson_group] = [ttl.index]
+    for lg, aixlist in lg_lessons.items():
+        if len(aixlist) > 1:
+            constraints.append(
+                ActivitiesNotOnSameDay(allocation, aixlist, '+')
+            )
+    return constraints
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from random import Random
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    from timetable.tt_basic_data import TimetableData
+    from timetable.tt_placement import (
+        get_saved_state,
+        load_timetable,
+        lesson_fits,
+    )
+    open_database()
+
+    tt_data = TimetableData()
+    allocation = load_timetable(tt_data, get_saved_state(tt_data.tt_lessons))
+    constraints = get_constraints(allocation)
+    print(f"\n+ {len(constraints)} constraints")
+    tracker = PenaltyTracker(allocation, constraints)
+    print("  Total penalty:", tracker.total())
+
+    # Place all unplaced lessons randomly, where possible
+    rng = Random(0)
+    nslots = len(allocation.teacher_weeks)
+    for ttl in tt_data.tt_lessons[1:]:
+        if allocation.allocation_state[ttl.index][0] == 0:
+            slots = [t for t in range(1, nslots) if lesson_fits(
+                allocation, ttl, t
+            )]
+            if slots:
+                allocate_lesson(allocation, ttl, rng.choice(slots))
+    allocation.journal.clear()
+    print("  Total penalty (random placement):", tracker.evaluate_all())
+
+    # Compare incremental and full evaluation for random moves
+    moves = []
+    for i in range(2000):
+        ttl = rng.choice(tt_data.tt_lessons[1:])
+        t = rng.randrange(1, nslots)
+        if lesson_fits(allocation, ttl, t):
+            moves.append((ttl, t))
+    start = timer()
+    deltas = [tracker.move_delta(ttl, t) for ttl, t in moves]
+    t1 = timer() - start
+    total = tracker.total()
+    start = timer()
+    full = []
+    for ttl, t in moves:
+        changes = allocate_lesson(allocation, ttl, t)
+        full.append(
+            sum(c.evaluate() for c in constraints) - total
+        )
+        undo_changes(allocation, changes)
+    t2 = timer() - start
+    assert deltas == full
+    print(f"  {len(moves)} moves, incremental: {t1:.4f} s, full: {t2:.4f} s")
@@ -1,7 +1,7 @@
 """
 timetable/tt_placement.py
 
-Last updated:  2023-09-29
+Last updated:  2026-10-16
 
 Handle the basic information for timetable display and processing.
 
@@ -39,23 +39,25 @@ T = TRANSLATIONS("timetable.tt_placement")
 
 from typing import NamedTuple, Optional
 
+import numpy as np
+
 from core.basic_data import get_days, get_periods
-from timetable.tt_basic_data import TT_LESSON
+from core.db_access import db_bulk_update
+from timetable.tt_basic_data import TT_LESSON, mask2slots
+from timetable.tt_matching import max_matching
 
 #TODO: What should these be?! As they are collected in a set they must
 # be hashable.
 DAY_OVERFLOW = "Day overflow"
+SLOT_BLOCKED = "Time slot not available"
 TEACHER_BLOCKED = "Teacher(s) unavailable"
 GROUP_BLOCKED = "Group(s) unavailable"
 ROOM_BLOCKED = "Room(s) unavailable"
+ROOMS_CHANGED = "Saved room(s) not available"
 
 ### -----
 
-#?
-#class PlacementEngine:
-#    def __init__(self):
-
-#        return
+# The automatic placement is in timetable/tt_engine.py.
 
 # Index 0 in TT_LESSONS is reserved for null/"empty", it is not a
 # TT_LESSON.
@@ -70,8 +72,10 @@ class Allocation:
         "tt_data", #: TimetableData
         "teacher_weeks", #: list[list[int]]
         "group_weeks", #: list[list[int]]
+        "class_weeks", #: list[list[int]]
         "room_weeks", #: list[list[int]]
         "allocation_state", #: list[list[int, list[int]]]
+        "journal", #: Journal
     )
 
     def __init__(self, tt_data):
@@ -82,12 +86,19 @@ class Allocation:
         (0 for empty). The primary division of each of these arrays is
         the time slot because most allocating and testing will be done
         with regard to a single time slot.
+        The class-groups are also available as bitmasks of the occupied
+        atomic groups, one integer per class in each time slot. This
+        allows quick clash tests (one AND per class), but it doesn't
+        record which lessons are responsible.
         In addition there is an array with entries for each lesson
         (activity). This contains, for each lesson, a pair of values,
         firstly the time slot – 0 for unallocated – and secondly a list
         of chosen room indexes (not the "fixed" ones) – again 0 for
         unallocated / no room selected.
         All "real" indexes start at 1, 0 generally being used as a "null".
+        Changes made by the placement functions (<allocate_lesson>,
+        <deallocate_lesson>) are recorded in a <Journal>, so that they
+        can be reversed.
         """
         self.tt_data = tt_data
         n_week_cells = tt_data.days_per_week * tt_data.periods_per_day + 1
@@ -95,6 +106,8 @@ class Allocation:
         self.teacher_weeks = [[0] * n_teachers for i in range(n_week_cells)]
         n_groups = tt_data.n_class_group_atoms + 1
         self.group_weeks = [[0] * n_groups for i in range(n_week_cells)]
+        n_classes = len(tt_data.class_index)
+        self.class_weeks = [[0] * n_classes for i in range(n_week_cells)]
         n_rooms = len(tt_data.room_index)
         self.room_weeks = [[0] * n_rooms for i in range(n_week_cells)]
         # Now the lesson allocation space
@@ -102,6 +115,170 @@ class Allocation:
         for ttl in tt_data.tt_lessons[1:]:
             state.append([0, [0] * len(ttl.room_choices)])
         self.allocation_state = state
+        self.journal = Journal()
+
+
+class AllocationNP(Allocation):
+    """An alternative to <Allocation> with the same structure, but with
+    the teacher, group and room weeks as contiguous 2-D numpy arrays
+    (time slot × resource, int32) and the class bitmasks (see
+    <Allocation>) as a 2-D int64 array (object, if a class has more
+    than 63 atomic groups). Indexing as <weeks[timeslot][index]>
+    still works – the rows are views – so the general placement
+    functions can be used unchanged. In addition, testing a lesson
+    against a time slot needs only a single gather on each array and
+    the possible slots for a lesson can be found for the whole week in
+    one pass.
+    """
+    __slots__ = (
+        "lesson_indexes", #: list[tuple[np.ndarray, ... ]]
+        "lesson_domains", #: list[np.ndarray] (boolean, over time slots)
+    )
+
+    def __init__(self, tt_data):
+        self.tt_data = tt_data
+        n_week_cells = tt_data.days_per_week * tt_data.periods_per_day + 1
+        self.teacher_weeks = np.zeros(
+            (n_week_cells, len(tt_data.teacher_index)), dtype=np.int32
+        )
+        self.group_weeks = np.zeros(
+            (n_week_cells, tt_data.n_class_group_atoms + 1), dtype=np.int32
+        )
+        self.room_weeks = np.zeros(
+            (n_week_cells, len(tt_data.room_index)), dtype=np.int32
+        )
+        nbits = max(b for ci, b in tt_data.atom_bits).bit_length()
+        self.class_weeks = np.zeros(
+            (n_week_cells, len(tt_data.class_index)),
+            dtype=np.int64 if nbits < 64 else object
+        )
+        # The index lists of the lessons are converted only once, so
+        # that the gathers don't need to build new arrays
+        # The lesson domains (bitmasks) are converted to boolean vectors.
+        ilist = [None]
+        dlist = [None]
+        slot_bits = [1 << t for t in range(n_week_cells)]
+        state = [[0, []]]
+        for ttl in tt_data.tt_lessons[1:]:
+            ilist.append((
+                np.array(ttl.teachers, dtype=np.intp),
+                np.array([ci for ci, b in ttl.classbits], dtype=np.intp),
+                np.array(
+                    [b for ci, b in ttl.classbits],
+                    dtype=self.class_weeks.dtype
+                ),
+                np.array(ttl.fixed_rooms, dtype=np.intp),
+            ))
+            d = tt_data.lesson_domains[ttl.index]
+            dlist.append(np.array([bool(d & b) for b in slot_bits]))
+            state.append([0, [0] * len(ttl.room_choices)])
+        self.lesson_indexes = ilist
+        self.lesson_domains = dlist
+        self.allocation_state = state
+        self.journal = Journal()
+
+    def is_blocked(self, tt_lesson: TT_LESSON, timeslot: int) -> bool:
+        """Test the "critical constraints" (see <critical_constraints>)
+        for the given lesson and time slot. Only the fact of a blockage
+        is returned, not its cause.
+        Cells occupied by the lesson itself don't count as blocked.
+        """
+        ttli = tt_lesson.index
+        if not self.lesson_domains[ttli][timeslot]:
+            return True
+        tix, cix, cbits, rix = self.lesson_indexes[ttli]
+        tmax = timeslot + tt_lesson.length
+        for weeks, ix in (
+            (self.teacher_weeks, tix),
+            (self.room_weeks, rix),
+        ):
+            cells = weeks[timeslot:tmax, ix]
+            if ((cells != 0) & (cells != ttli)).any():
+                return True
+        # Within the lesson's own span, its groups can't be occupied by
+        # another lesson.
+        t0 = self.allocation_state[ttli][0]
+        t1 = t0 + tt_lesson.length if t0 else 0
+        for t in range(timeslot, tmax):
+            if not t0 <= t < t1 and (self.class_weeks[t, cix] & cbits).any():
+                return True
+        return False
+
+    def busy_slots(self, tt_lesson: TT_LESSON) -> np.ndarray:
+        """Return a boolean vector over the time slots which is true
+        where a teacher, group or fixed room of the lesson is occupied
+        by another lesson.
+        """
+        ttli = tt_lesson.index
+        tix, cix, cbits, rix = self.lesson_indexes[ttli]
+        busy = np.zeros(self.teacher_weeks.shape[0], dtype=bool)
+        if len(cix):
+            busy |= (self.class_weeks[:, cix] & cbits).any(axis=1)
+            # Within the lesson's own span, its groups can't be occupied
+            # by another lesson.
+            t0 = self.allocation_state[ttli][0]
+            if t0:
+                busy[t0:t0 + tt_lesson.length] = False
+        for weeks, ix in (
+            (self.teacher_weeks, tix),
+            (self.room_weeks, rix),
+        ):
+            if len(ix):
+                cells = weeks[:, ix]
+                busy |= ((cells != 0) & (cells != ttli)).any(axis=1)
+        return busy
+
+    def free_starts(self, tt_lesson: TT_LESSON) -> np.ndarray:
+        """Return a boolean vector over the time slots which is true
+        where the lesson could start without clashing with another
+        lesson (teachers, groups and fixed rooms). Only slots in the
+        lesson's domain are considered. Room choices are not considered.
+        """
+        free = ~self.busy_slots(tt_lesson)
+        fits = self.lesson_domains[tt_lesson.index].copy()
+        n = len(free)
+        for i in range(tt_lesson.length):
+            # Shift the free-vector so that slot s + i is tested at s
+            fits[:n - i] &= free[i:]
+        return fits
+
+
+class Journal:
+    """A trail of the changes made to an <Allocation>, so that they can
+    be reversed without copying the allocation. Each entry is a triple:
+        (container, index, old value)
+    where the container is one of the time-slot rows of the "weeks"
+    arrays, an entry in <allocation_state> or its room list.
+    A "checkpoint" is just the length of the trail at a particular
+    point. Rolling back to a checkpoint restores the entries in reverse
+    order, so its cost depends only on the number of changes made since
+    the checkpoint.
+    """
+    __slots__ = ("trail",)
+
+    def __init__(self):
+        self.trail = []
+
+    def checkpoint(self) -> int:
+        return len(self.trail)
+
+    def set(self, container, index: int, value):
+        """Record the old value and then set the new one.
+        """
+        self.trail.append((container, index, container[index]))
+        container[index] = value
+
+    def rollback(self, checkpoint: int = 0):
+        trail = self.trail
+        while len(trail) > checkpoint:
+            container, index, value = trail.pop()
+            container[index] = value
+
+    def clear(self):
+        """Accept all changes, they can then no longer be reversed.
+        """
+        self.trail.clear()
+
 
 # To preserve the allocation state over runs, the tt_lesson indexes
 # should be converted to lesson-ids and the times and rooms converted
@@ -111,6 +288,8 @@ class Allocation:
 # table? Perhaps if multiple results with the same configuration are
 # to be saved? But saving the whole database is also a serious contender
 # for this scenario.
+#NOTE: A compact binary form of the state, which can be stored as a
+# file or in a single BLOB field, is available in tt_snapshot.
 #NOTE: As the compulsory single rooms of an activity must be available
 # for a placement to be successful, there is no need to have them as
 # part of the "state". Of course, also a deallocation will have to
@@ -145,20 +324,22 @@ def critical_constraints(
     time-slot. Where the cause of blockage is not another lesson, the
     lesson-id field will be -1.
     """
-#TODO: Using a dict may be okay for manual placement, but for automatic
-# placement, this function should be replaced by one which returns, say,
-# false as soon as it detects a problem.
+# Using a dict is okay for manual placement, but for automatic placement
+# use <lesson_fits>, which returns false as soon as it detects a problem.
     blockers = {}   # {lesson-id: [cause, ...]}
     #print("TIMESLOT", timeslot, allocation.teacher_weeks[timeslot])
     #print("TIMESLOT", timeslot, allocation.group_weeks[timeslot])
 
-    # Check that the start time is not too late to fit in the day
-    nperiods = allocation.tt_data.periods_per_day
-    if (timeslot - 1) % nperiods + tt_lesson.length > nperiods:
-#TODO--
-        print("!!! DAY overflow:", timeslot, tt_lesson.length, tt_lesson.lesson_id)
-
-        blockers[-1] = {DAY_OVERFLOW}
+    # Check that the time slot is in the lesson's domain (start time not
+    # too late to fit in the day, teachers and classes available, fixed
+    # time respected).
+    tt_data = allocation.tt_data
+    if not (tt_data.lesson_domains[tt_lesson.index] >> timeslot) & 1:
+        nperiods = tt_data.periods_per_day
+        if (timeslot - 1) % nperiods + tt_lesson.length > nperiods:
+            blockers[-1] = {DAY_OVERFLOW}
+        else:
+            blockers[-1] = {SLOT_BLOCKED}
         return blockers
 
     t = timeslot
@@ -169,9 +350,6 @@ def critical_constraints(
         for tx in tt_lesson.teachers:
             i = pslot[tx]
             if i != 0:
-#TODO--
-                print("TEACHER", tx, i, t)
-
                 try:
                     blockers[i].add(TEACHER_BLOCKED)
                 except KeyError:
@@ -181,9 +359,6 @@ def critical_constraints(
         for cg in tt_lesson.classgroups:
             i = pslot[cg]
             if i != 0:
-#TODO--
-                print("GROUP", cg, i, t)
-
                 try:
                     blockers[i].add(GROUP_BLOCKED)
                 except KeyError:
@@ -196,13 +371,10 @@ def critical_constraints(
         for r in tt_lesson.fixed_rooms:
             i = pslot[r]
             if i != 0:
-#TODO--
-                print("ROOM", r, i, t)
-
                 try:
-                    blockers[i].add(GROUP_BLOCKED)
+                    blockers[i].add(ROOM_BLOCKED)
                 except KeyError:
-                    blockers[i] = {GROUP_BLOCKED}
+                    blockers[i] = {ROOM_BLOCKED}
 
         # Room choices are ignored here
 
@@ -210,6 +382,76 @@ def critical_constraints(
     return blockers
 
 
+def lesson_fits(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    timeslot: int
+) -> bool:
+    """A fast alternative to <critical_constraints> for search loops.
+    The same tests are made, but the result is just true if the lesson
+    can be placed in the given time slot, false otherwise. Testing stops
+    at the first problem, nothing is collected and nothing is reported.
+    Cells occupied by the lesson itself count as free, so that the
+    function can also be used to test moving a lesson which is already
+    placed.
+    """
+    ttli = tt_lesson.index
+    if not (allocation.tt_data.lesson_domains[ttli] >> timeslot) & 1:
+        return False
+    # The class-groups are tested using the bitmasks, which don't
+    # identify the lesson. Within the lesson's own span, however, its
+    # groups can't be occupied by another lesson, so they needn't be
+    # tested.
+    t0 = allocation.allocation_state[ttli][0]
+    t1 = t0 + tt_lesson.length if t0 else 0
+    t = timeslot
+    tmax = t + tt_lesson.length
+    while t < tmax:
+        pslot = allocation.teacher_weeks[t]
+        for tx in tt_lesson.teachers:
+            i = pslot[tx]
+            if i != 0 and i != ttli:
+                return False
+        if not t0 <= t < t1:
+            pslot = allocation.class_weeks[t]
+            for ci, bits in tt_lesson.classbits:
+                if pslot[ci] & bits:
+                    return False
+        pslot = allocation.room_weeks[t]
+        for r in tt_lesson.fixed_rooms:
+            i = pslot[r]
+            if i != 0 and i != ttli:
+                return False
+        t += 1
+    return True
+
+
+def blocking_lessons(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    timeslot: int,
+) -> set[int]:
+    """Return the indexes of the activities occupying the teachers,
+    groups or fixed rooms of <tt_lesson> in the time slots it would
+    cover if placed at <timeslot>. Unlike <critical_constraints>, only
+    the activities are collected, the domain is not tested.
+    """
+    ttli = tt_lesson.index
+    blockers = set()
+    for t in range(timeslot, timeslot + tt_lesson.length):
+        for weeks, ix in (
+            (allocation.teacher_weeks, tt_lesson.teachers),
+            (allocation.group_weeks, tt_lesson.classgroups),
+            (allocation.room_weeks, tt_lesson.fixed_rooms),
+        ):
+            pslot = weeks[t]
+            for i in ix:
+                a = pslot[i]
+                if a != 0 and a != ttli:
+                    blockers.add(int(a))
+    return blockers
+
+
 #TODO: As far as constraint handling is concerned, it looks like it
 # might be best to handle all non-critical constraints together. Hard
 # constraints could be placed at the head of the processing queue. They
@@ -230,8 +472,14 @@ def test_constraints(
     if this is only a test, the activity must be removed afterwards.
     The parameter <undo> acts as a switch for the removal (a true value
     will cause the activity to be removed again).
+    The critical constraints are tested first, the activity is not
+    placed if they fail.
+    Return the blocking information from <critical_constraints>, empty
+    if the activity can be placed.
     """
-    print("TODO")
+    blockers = critical_constraints(allocation, tt_lesson, timeslot)
+    if blockers:
+        return blockers
 
 # In general, the evaluation of penalties should perhaps be ordered
 # according to the weightings. It might be possible to speed up some
@@ -275,11 +523,10 @@ def test_constraints(
 
 #TODO: Would I want to know which rooms / lessons were blocking the allocation?
 
-    changes = allocate_lesson()
-    hc_blocked = test_hard_constraints()
-
-    if undo or hc_blocked:
-        undo_changes(changes)
+    # The critical constraints have been satisfied (<blockers> is empty)
+    changes = allocate_lesson(allocation, tt_lesson, timeslot)
+    if undo:
+        undo_changes(allocation, changes)
 
 #TODO: test other constraints.
 # Which constraints should be tested here?
@@ -305,12 +552,153 @@ def test_constraints(
 # existence of hard constraints, or special high-penalty constraints
 # affect this?)
 
-    return hc_blocked #? include room choices?
+    return blockers
 
 # It should be possible to detect blocking lessons automatically so that
 # the placement of a particular lesson can be forced. Perhaps not the
 # room choices, though?
 
+class FORCED_PLACEMENT(NamedTuple):
+    moves: list[tuple[int, int]]    # (activity index, time slot)
+    no_rooms: list[int]     # activities for which no rooms were found
+
+
+def force_placement(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    timeslot: int,
+    depth: int = 2,
+    max_nodes: int = 2000,
+    tracker = None,
+) -> FORCED_PLACEMENT:
+    """Place the given activity in the specified time slot, removing
+    the activities which block it and placing these elsewhere (an
+    "ejection chain"). A removed activity which doesn't fit in any
+    other slot may itself remove blocking activities, and so on, up to
+    <depth> levels. Activities with fixed times and those already moved
+    in the chain are not removed. The search is bounded by <max_nodes>
+    trial placements.
+    The room choices of the moved activities are allocated again (see
+    <allocate_rooms>). A chain in which one of them would be left
+    without a room is not accepted, the activity is then reported as
+    blocked by its rooms.
+    The cheapest chain found is applied: the one with fewest moves,
+    then – if a <PenaltyTracker> (see tt_penalties) is supplied – the
+    one with the lowest total penalty. The changes are recorded in the
+    allocation's journal.
+    Return the moves as a list of (activity index, time slot) pairs,
+    the forced placement first – empty if no chain was found (the
+    allocation is then unchanged) – and the indexes of the activities
+    for which no rooms could be found in the rejected chains.
+    """
+    tt_data = allocation.tt_data
+    tt_lessons = tt_data.tt_lessons
+    domains = tt_data.lesson_domains
+    journal = allocation.journal
+    ttli = tt_lesson.index
+    if tt_lesson.time and tt_lesson.time != timeslot:
+        return FORCED_PLACEMENT([], [])
+    if not (domains[ttli] >> timeslot) & 1:
+        return FORCED_PLACEMENT([], [])
+    changes = journal.checkpoint()
+    best = []       # [(cost, moves)]
+    moves = []      # [(activity index, time slot), ... ]
+    locked = set()  # the activities in <moves>
+    no_rooms = set()
+    nodes = 0
+
+    def rooms_found() -> bool:
+        """Allocate the rooms of the moved activities, return <True> if
+        none of them is left without a room. Activities without rooms
+        are added to <no_rooms>.
+        """
+        ok = True
+        for i, t in moves:
+            ttl = tt_lessons[i]
+            if ttl.room_choices:
+                allocate_rooms(allocation, ttl)
+        for i, t in moves:
+            if 0 in allocation.allocation_state[i][1]:
+                no_rooms.add(i)
+                ok = False
+        return ok
+
+    def place(ttl: TT_LESSON, t: int) -> Optional[list[TT_LESSON]]:
+        """Place <ttl> at <t>, removing the activities blocking it.
+        Return the removed activities, <None> if one of them may not
+        be removed.
+        """
+        removed = []
+        for i in blocking_lessons(allocation, ttl, t):
+            if i in locked or tt_lessons[i].time:
+                return None
+            removed.append(tt_lessons[i])
+        for b in removed:
+            deallocate_lesson(allocation, b)
+        allocate_lesson(allocation, ttl, t)
+        if tracker is not None:
+            tracker.update([ttl] + removed)
+        moves.append((ttl.index, t))
+        locked.add(ttl.index)
+        return removed
+
+    def seat(pending: list[tuple[TT_LESSON, int]]):
+        """Try to place the removed activities (with their levels).
+        """
+        nonlocal nodes
+        if best:
+            # Each pending activity needs at least one move. Without
+            # penalties, a chain of equal length is no improvement.
+            n = len(moves) + len(pending)
+            if n > best[0][0][0] or (n == best[0][0][0] and not tracker):
+                return
+        if not pending:
+            cost = (len(moves), tracker.total() if tracker else 0)
+            if not best or cost < best[0][0]:
+                cp = journal.checkpoint()
+                if rooms_found():
+                    best[:] = [(cost, list(moves))]
+                undo_changes(allocation, cp)
+            return
+        (ttl, level), rest = pending[0], pending[1:]
+        direct, forced = [], []
+        for t in mask2slots(domains[ttl.index]):
+            if lesson_fits(allocation, ttl, t):
+                direct.append(t)
+            elif level < depth:
+                forced.append(t)
+        for t in direct + forced:
+            if nodes >= max_nodes:
+                return
+            nodes += 1
+            cp = journal.checkpoint()
+            removed = place(ttl, t)
+            if removed is not None:
+                seat(rest + [(b, level + 1) for b in removed])
+                moves.pop()
+                locked.discard(ttl.index)
+            undo_changes(allocation, cp)
+
+    removed = place(tt_lesson, timeslot)
+    if removed is not None:
+        seat([(b, 1) for b in removed])
+    undo_changes(allocation, changes)
+    if not best:
+        return FORCED_PLACEMENT([], sorted(no_rooms))
+    chain = best[0][1]
+    moved = [tt_lessons[i] for i, t in chain]
+    for ttl in moved:
+        deallocate_lesson(allocation, ttl)
+    for ttl, (i, t) in zip(moved, chain):
+        allocate_lesson(allocation, ttl, t)
+    # The same rooms as in the search are found
+    moves[:] = chain
+    rooms_found()
+    if tracker is not None:
+        tracker.update(moved)
+    return FORCED_PLACEMENT(chain, sorted(no_rooms))
+
+
 
 def resolve_room_choice(
     allocation: Allocation,
@@ -320,6 +708,12 @@ def resolve_room_choice(
     """Try to allocate rooms satisfying the choice lists.
     If a full room list is not possible with the available rooms,
     the returned list will contain one or more null (0) rooms.
+    The rooms are allocated by a maximum bipartite matching of the
+    requirements (<tt_lesson.room_choices>) to the rooms which are free
+    in all the lesson's periods, so the number of null rooms is as
+    small as possible.
+    Return the number of null rooms and the room list (one entry for
+    each requirement).
     """
 #TODO: Perhaps I don't need to return the number of zeros – it depends
 # on how the results are used. It could be that the result is always
@@ -336,17 +730,9 @@ def resolve_room_choice(
     # a room. For the penalty calculation, only the fact of the blockage
     # is relevant.
 
-# Note the new room_choices structure! Would it be better to include
-# various permutations of the possible combinations after all?
-# What should happen now if no full match is found?
-# I suppose some fancy structure with shared sub-trees might make things
-# easier here (?), but would be difficult to set up ...
-# Actually, on reflection, I'm not really sure that the added complexity
-# is worth it at all. Yes the tree structure requires fewer comparisons
-# in general, but potentially not so very many fewer and the total
-# cost may be similar or higher. Perhaps I should just accept that
-# matching choice lists is time-consuming and keep it simple?
-# So, revert to simple lists???
+# The room choices are resolved by bipartite matching (Hopcroft-Karp)
+# of the requirements to the free rooms, so there is no need to
+# enumerate combinations.
 # Consider also making room allocation a purely soft constraint, though
 # perhaps with an especially large penalty for "+"-weighting.
 # Actually, wouldn't purely hard make more sense? In the end, the lessons
@@ -359,8 +745,8 @@ def resolve_room_choice(
 # Special consideration:
 # When resolving room choices manually, the possible rooms for each
 # requirement should be shown, so that the one to be chosen can be
-# selected. However, at present I just have a list of possible solution
-# vectors. I suppose I could collect a set from each index?
+# selected. The requirement lists (see <simplify_room_lists>) provide this
+# directly.
 # When forcing a particular room, it could be that another lesson gets
 # removed, but if only a room-choice is concerned, that could also
 # stay placed, but get a penalty. Would a room-choice conflict even
@@ -375,30 +761,252 @@ def resolve_room_choice(
 # for this case.
 
     rclist = tt_lesson.room_choices
-    if rclist:
-        rvlen = len(rclist[0])
-    else:
+    if not rclist:
         return (0, [])
-    best = None
-    bestzeros = rvlen
-    for rc in rclist:
-        zeros = 0
-        rl = []
-        for r in rc:
-            for rs in rslots:
-                if rs[r] != 0:
-                    rl.append(0)
-                    zeros += 1
-                    break
-            else:
-                rl.append(r)
-        if zeros == 0:
-            return (0, rl)
-        if zeros < bestzeros:
-            bestzeros = zeros
-            best = rl
-    # Return the "best" result, all zeros if no rooms are free.
-    return (bestzeros, best or [0] * rvlen)
+    # Only rooms which are free in all the lesson's periods can be used
+    # (cells occupied by the lesson itself count as free).
+    ttli = tt_lesson.index
+    free = [
+        [r for r in rc if all(rs[r] in (0, ttli) for rs in rslots)]
+        for rc in rclist
+    ]
+    # Start from the current choice, if the lesson is placed here
+    state = allocation.allocation_state[ttli]
+    n, rl = max_matching(free, state[1] if state[0] == timeslot else None)
+    return (len(rl) - n, rl)
+
+
+def allocate_rooms(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    joint: bool = True,
+) -> int:
+    """Choose the rooms for the room-choice requirements of a placed
+    activity (see <resolve_room_choice>). If not all requirements can
+    be satisfied and <joint> is true, the room choices of all the
+    activities in the time slots concerned are allocated again together
+    (see <reallocate_rooms>).
+    The changes are recorded in the allocation's journal.
+    Return the number of null rooms remaining (including those of any
+    other activities involved in a joint reallocation).
+    """
+    timeslot = allocation.allocation_state[tt_lesson.index][0]
+    if timeslot == 0 or not tt_lesson.room_choices:
+        return 0
+    n, rooms = resolve_room_choice(allocation, tt_lesson, timeslot)
+    allocate_lesson(allocation, tt_lesson, timeslot, rooms)
+    if n and joint:
+        return reallocate_rooms(
+            allocation, range(timeslot, timeslot + tt_lesson.length)
+        )
+    return n
+
+
+def reallocate_rooms(allocation: Allocation, timeslots) -> int:
+    """Allocate the room choices of all placed activities in the given
+    time slots together, instead of one activity at a time.
+    The slots are extended to cover the full spans of the activities
+    involved (and of the activities overlapping these spans, etc.). Each
+    such block of slots is handled separately: the chosen rooms are
+    removed and then allocated again, slot by slot in time order. In
+    each slot, the requirements of all the activities starting there
+    are matched together to the rooms which are free over their spans
+    (see <max_matching>, the previous choices are the starting point).
+    For single-period activities this gives the best possible
+    allocation, with multi-period activities an activity which starts
+    earlier keeps its rooms for its whole span.
+    A block is only changed if there are then fewer null rooms.
+    The changes are recorded in the allocation's journal.
+    Return the number of null rooms remaining in the activities
+    involved.
+    """
+    state = allocation.allocation_state
+    room_weeks = allocation.room_weeks
+    journal = allocation.journal
+    setcell = journal.set
+    # The placed activities with room choices in each time slot
+    slot_lessons = {}
+    for ttl in allocation.tt_data.tt_lessons[1:]:
+        t0 = state[ttl.index][0]
+        if t0 and ttl.room_choices:
+            for t in range(t0, t0 + ttl.length):
+                try:
+                    slot_lessons[t].append(ttl)
+                except KeyError:
+                    slot_lessons[t] = [ttl]
+    done = set()
+    nulls = 0
+    for timeslot in timeslots:
+        if timeslot in done or timeslot not in slot_lessons:
+            continue
+        # Collect a block of time slots linked by activity spans
+        block = set()
+        lessons = {}
+        pending = [timeslot]
+        while pending:
+            t = pending.pop()
+            if t in block:
+                continue
+            block.add(t)
+            for ttl in slot_lessons.get(t, ()):
+                if ttl.index not in lessons:
+                    lessons[ttl.index] = ttl
+                    t0 = state[ttl.index][0]
+                    pending.extend(range(t0, t0 + ttl.length))
+        done.update(block)
+        changes = journal.checkpoint()
+        # Remove the current choices, keeping them as a starting point
+        previous = {}
+        nulls0 = 0
+        for ttli, ttl in lessons.items():
+            t0, rooms = state[ttli]
+            previous[ttli] = list(rooms)
+            nulls0 += rooms.count(0)
+            for t in range(t0, t0 + ttl.length):
+                pslot = room_weeks[t]
+                for r in rooms:
+                    if r:
+                        setcell(pslot, r, 0)
+            for i, r in enumerate(rooms):
+                if r:
+                    setcell(rooms, i, 0)
+        n_null = 0
+        for t in sorted(block):
+            requirements = []
+            choices = []
+            match = []
+            for ttl in slot_lessons[t]:
+                ttli = ttl.index
+                if state[ttli][0] != t:
+                    continue
+                rslots = room_weeks[t:t + ttl.length]
+                for i, rc in enumerate(ttl.room_choices):
+                    requirements.append((ttl, i))
+                    choices.append(
+                        [r for r in rc if all(rs[r] == 0 for rs in rslots)]
+                    )
+                    match.append(previous[ttli][i])
+            if not requirements:
+                continue
+            n, rl = max_matching(choices, match)
+            n_null += len(rl) - n
+            for (ttl, i), r in zip(requirements, rl):
+                if r:
+                    ttli = ttl.index
+                    setcell(state[ttli][1], i, r)
+                    for rs in room_weeks[t:t + ttl.length]:
+                        setcell(rs, r, ttli)
+        if n_null < nulls0:
+            nulls += n_null
+        else:
+            undo_changes(allocation, changes)
+            nulls += nulls0
+    return nulls
+
+
+def repair_rooms(allocation: Allocation) -> int:
+    """Reallocate the room choices (see <reallocate_rooms>) in all
+    time slots where a placed activity has a null room.
+    The changes are recorded in the allocation's journal.
+    Return the number of null rooms remaining in these activities.
+    """
+    timeslots = [
+        t for t, rooms in allocation.allocation_state[1:]
+        if t and 0 in rooms
+    ]
+    if timeslots:
+        return reallocate_rooms(allocation, timeslots)
+    return 0
+
+
+class SLOT_CANDIDATE(NamedTuple):
+    timeslot: int
+    blockers: list[int]     # activities which would need to be removed
+    null_rooms: int         # number of unsatisfied room choices
+    rooms: list[int]        # chosen rooms (see <resolve_room_choice>)
+    penalty: int            # change in the total penalty
+
+
+def _columns(weeks, ix: list[int]) -> np.ndarray:
+    """Return the given columns of a "weeks" array (see <Allocation>)
+    as a 2-D numpy array (time slot × index).
+    """
+    if isinstance(weeks, np.ndarray):
+        return weeks[:, ix]
+    return np.array(
+        [[row[i] for i in ix] for row in weeks], dtype=np.int32
+    ).reshape(len(weeks), len(ix))
+
+
+def seek_placements(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    tracker = None,
+) -> list[SLOT_CANDIDATE]:
+    """Find all the time slots in which the given activity could be
+    placed, if necessary by removing the activities which block it.
+    Slots outside the activity's domain and slots where an activity
+    with a fixed time is in the way are not included.
+    The blocking activities (teachers, groups, fixed rooms) are found
+    for the whole week in one pass over numpy arrays (most efficient
+    with an <AllocationNP>). For each candidate slot the room choices
+    are then resolved and – if a <PenaltyTracker> (see tt_penalties)
+    is supplied – the change in the total penalty is calculated, both
+    after the removal of the blocking activities. The allocation is
+    left unchanged.
+    Return a list of <SLOT_CANDIDATE>s, the best first: fewest blocking
+    activities, then fewest null rooms, then lowest penalty.
+    """
+    ttli = tt_lesson.index
+    length = tt_lesson.length
+    tt_lessons = allocation.tt_data.tt_lessons
+    domain = allocation.tt_data.lesson_domains[ttli]
+    if not domain:
+        return []
+    occupied = np.concatenate(
+        [
+            _columns(allocation.teacher_weeks, tt_lesson.teachers),
+            _columns(allocation.group_weeks, tt_lesson.classgroups),
+            _columns(allocation.room_weeks, tt_lesson.fixed_rooms),
+        ],
+        axis=1,
+    )
+    occupied[occupied == ttli] = 0
+    # Row s of <spans> covers the cells of slots s to s + length - 1
+    nstarts = occupied.shape[0] - length + 1
+    spans = np.concatenate(
+        [occupied[i:i + nstarts] for i in range(length)], axis=1
+    )
+    busy = spans.any(axis=1)
+    journal = allocation.journal
+    candidates = []
+    for t in range(1, nstarts):
+        if not (domain >> t) & 1:
+            continue
+        if busy[t]:
+            blockers = [int(i) for i in np.unique(spans[t]) if i]
+            if any(tt_lessons[i].time for i in blockers):
+                continue
+        else:
+            blockers = []
+        changes = journal.checkpoint()
+        moved = [tt_lesson]
+        for i in blockers:
+            b = tt_lessons[i]
+            deallocate_lesson(allocation, b)
+            moved.append(b)
+        n, rooms = resolve_room_choice(allocation, tt_lesson, t)
+        if tracker is None:
+            delta = 0
+        else:
+            allocate_lesson(allocation, tt_lesson, t)
+            delta = tracker.update(moved)
+        undo_changes(allocation, changes)
+        candidates.append(SLOT_CANDIDATE(t, blockers, n, rooms, delta))
+    candidates.sort(
+        key=lambda c: (len(c.blockers), c.null_rooms, c.penalty, c.timeslot)
+    )
+    return candidates
 
 
 #########################################################
@@ -472,6 +1080,9 @@ def place_with_room_choices(
         pslot = allocation.group_weeks[t]
         for cg in ttl.classgroups:
             pslot[cg] = ttli
+        pslot = allocation.class_weeks[t]
+        for ci, bits in ttl.classbits:
+            pslot[ci] |= bits
 #TODO: comments not clear!
 #TODO:  if allocation.rooms_weighting != "":
 # ... if room allocation is regarded as a soft constraint ...
@@ -513,6 +1124,104 @@ def place_with_room_choices(
     #print("[]", timeslot, allocation.teacher_weeks)
 
 
+def allocate_lesson(
+    allocation: Allocation,
+    tt_lesson: TT_LESSON,
+    timeslot: int,
+    rooms: Optional[list[int]] = None,
+) -> int:
+    """Place the given activity in the specified time slot, covering
+    all its periods. If the activity is already placed, it is first
+    removed from its old slot.
+    <rooms> is an optional list of chosen rooms, one for each room
+    choice (see <Allocation>), 0 for no room.
+    It is assumed that the placement has been checked (for example
+    with <lesson_fits>) – the teacher, group and room cells are simply
+    overwritten.
+    All changes are recorded in the allocation's journal. The value
+    returned is the journal checkpoint before the changes, which can be
+    passed to <undo_changes>.
+    """
+    journal = allocation.journal
+    changes = journal.checkpoint()
+    ttli = tt_lesson.index
+    state = allocation.allocation_state[ttli]
+    if state[0]:
+        deallocate_lesson(allocation, tt_lesson)
+    setcell = journal.set
+    rchoices = state[1]
+    if rooms:
+        for i, r in enumerate(rooms):
+            setcell(rchoices, i, r)
+    setcell(state, 0, timeslot)
+    for t in range(timeslot, timeslot + tt_lesson.length):
+        # Place teachers
+        pslot = allocation.teacher_weeks[t]
+        for tx in tt_lesson.teachers:
+            setcell(pslot, tx, ttli)
+        # Place class-groups
+        pslot = allocation.group_weeks[t]
+        for cg in tt_lesson.classgroups:
+            setcell(pslot, cg, ttli)
+        pslot = allocation.class_weeks[t]
+        for ci, bits in tt_lesson.classbits:
+            setcell(pslot, ci, pslot[ci] | bits)
+        # Place single compulsory rooms and chosen rooms
+        pslot = allocation.room_weeks[t]
+        for r in tt_lesson.fixed_rooms:
+            setcell(pslot, r, ttli)
+        for r in rchoices:
+            if r:
+                setcell(pslot, r, ttli)
+    return changes
+
+
+def deallocate_lesson(allocation: Allocation, tt_lesson: TT_LESSON) -> int:
+    """Remove the given activity from its time slot, if it is placed,
+    also freeing its chosen rooms.
+    All changes are recorded in the allocation's journal. The value
+    returned is the journal checkpoint before the changes, which can be
+    passed to <undo_changes>.
+    """
+    journal = allocation.journal
+    changes = journal.checkpoint()
+    ttli = tt_lesson.index
+    state = allocation.allocation_state[ttli]
+    timeslot = state[0]
+    if timeslot == 0:
+        return changes
+    setcell = journal.set
+    rchoices = state[1]
+    for t in range(timeslot, timeslot + tt_lesson.length):
+        pslot = allocation.teacher_weeks[t]
+        for tx in tt_lesson.teachers:
+            setcell(pslot, tx, 0)
+        pslot = allocation.group_weeks[t]
+        for cg in tt_lesson.classgroups:
+            setcell(pslot, cg, 0)
+        pslot = allocation.class_weeks[t]
+        for ci, bits in tt_lesson.classbits:
+            setcell(pslot, ci, pslot[ci] & ~bits)
+        pslot = allocation.room_weeks[t]
+        for r in tt_lesson.fixed_rooms:
+            setcell(pslot, r, 0)
+        for r in rchoices:
+            if r:
+                setcell(pslot, r, 0)
+    for i, r in enumerate(rchoices):
+        if r:
+            setcell(rchoices, i, 0)
+    setcell(state, 0, 0)
+    return changes
+
+
+def undo_changes(allocation: Allocation, changes: int):
+    """Reverse all changes to the allocation made since the journal
+    checkpoint <changes>.
+    """
+    allocation.journal.rollback(changes)
+
+
 def place_lesson_initial(
     allocation: Allocation,
     tt_lessons: list[Optional[TT_LESSON]],  # only the first entry is <None>
@@ -522,45 +1231,14 @@ def place_lesson_initial(
     """Place the given activity in the specified time slot.
     !!! Only do this when the allocation slots are really empty, which is
     not checked here.
+    Room choices are not allocated here.
 
     allocation: placement data structures
     tt_lessons: the activity vector
     ttli: index of the activity to test (1+)
     timeslot: index of the time slot to test (1+)
     """
-#TODO: Record changes – to enable their reversal.
-    ttl = tt_lessons[ttli]
-    #print("\n??? TTL:", ttli, timeslot)
-    #print("[]", len(allocation.teacher_weeks), allocation.teacher_weeks)
-    length = ttl.length
-    state = allocation.allocation_state[ttli]
-    state[0] = timeslot
-
-#TODO: deal with length (number of periods)
-    # Place teachers
-    pslot = allocation.teacher_weeks[timeslot]
-    for t in ttl.teachers:
-        pslot[t] = ttli
-    # Place class-groups
-    pslot = allocation.group_weeks[timeslot]
-    for cg in ttl.classgroups:
-        pslot[cg] = ttli
-#TODO: comments not clear!
-    # Place single compulsory rooms
-    pslot = allocation.room_weeks[timeslot]
-    # Skip the compulsory single rooms (see comment to <get_state_vector()>)
-    for r in ttl.fixed_rooms:
-        pslot[r] = ttli
-#?
-    # Room choices are not allocated here
-    rclist = state[1]
-    for i in range(len(rclist)):
-        rclist[i] = 0
-    #i = 0
-    #for rc in ttl.room_choices:
-    #    rclist[i] = 0
-    #    i += 1
-    #print("[]", timeslot, allocation.teacher_weeks)
+    allocate_lesson(allocation, tt_lessons[ttli], timeslot)
 
 
 # This should place all the activities/lessons in the timetable which
@@ -578,87 +1256,121 @@ def place_lesson_initial(
 
 
 
-#TODO
-def load_timetable(tt_data, state):
+class LOAD_CONFLICT(NamedTuple):
+    lesson: int             # activity index
+    timeslot: int           # the fixed or saved time slot
+    blockers: list[int]     # activities in the way (-1: not a lesson)
+    causes: list[str]       # DAY_OVERFLOW, TEACHER_BLOCKED, etc.
+
+
+def load_allocation(
+    tt_data,
+    state: Optional[list[tuple[int, list[int]]]],
+    first: Optional[list[int]] = None,
+) -> tuple[Allocation, list[LOAD_CONFLICT]]:
+    """Place all activities with fixed times and – if <state> is
+    supplied (see <get_saved_state>) – all activities with saved
+    placements, in a single pass.
+    The activities with fixed times are placed first, then those in
+    the optional list <first>, then the others, the most constrained
+    (fewest possible time slots, then most teachers and groups) first.
+    The fast test (<lesson_fits>) is used for each placement, the
+    blocking information is only collected for the activities which
+    can't be placed – these are left unplaced.
+    The saved rooms are used for the room choices as far as possible,
+    missing rooms are also reported as conflicts (the activity is
+    placed anyway).
+    Return the allocation and a list of the conflicts.
+    """
     tt_lessons = tt_data.tt_lessons
+    domains = tt_data.lesson_domains
     allocation = Allocation(tt_data)
-    i = 0
-    imax = len(tt_lessons) - 1
-    while i < imax:
-        i += 1
-        ttl = tt_lessons[i]
-        #print("???", ttl.room_choices)
-        timeslot = ttl.time
-        if timeslot != 0:
-#TODO: Could have been "^ ..." (lesson reference)!
-            blockers = critical_constraints(
-                allocation, ttl, timeslot
-            )
-            if blockers:
-                #print("   BLOCKERS", i, blockers)
-                ttlx = tt_lessons[list(blockers)[0]]
-                REPORT(
-                    "ERROR",
-                    T["CLASHING_FIXED_TIME"].format(
-                        activity1=print_activity(ttlx),
-                        activity2=print_activity(ttl),
-                        time=timeslot_text(timeslot)
-                    )
-                )
-                continue
-#TODO: room choices
-            if ttl.placement0 == timeslot:
-                # Remove rooms from saved list if they are in the fixed
-                # list.
-#TODO: Is that sensible? Maybe just fail because soething has changed?
-                r0 = state[i][1]
-                for r in ttl.fixed_rooms:
-                    try:
-                        r0.remove(r)
-                    except ValueError:
-                        pass
-                #print("+++ CHECK ROOM CHOICES", r0)
-                if not test_room_allocation(
-                    allocation,
-                    ttl.room_choices,
-                    r0,
-                    timeslot,
-                    ttl.length,
-                ):
-                    print(
-                        "??? ROOM MISMATCH: ",
-                        state[i][1],
-                        r0
-                    )
-                    print(" ~~", ttl)
-
+    first = set(first or ())
+    pending = []
+    for ttl in tt_lessons[1:]:
+        if ttl.time:
+            timeslot = ttl.time
+            saved = state[ttl.index] if state else None
+            rooms = saved[1] if saved and saved[0] == timeslot else None
         elif state:
-#TODO: rather add to pending list, for processing after all fixed
-# placements?
-
-            timeslot = state[i][0]
+            timeslot, rooms = state[ttl.index]
             if timeslot == 0:
                 continue
-            blockers = critical_constraints(
-                allocation, tt_lessons[i], timeslot
-            )
-#--
-            print("?????", i, timeslot, blockers)
-
-            if blockers:
-                continue
         else:
             continue
+        pending.append((
+            ttl.time == 0,
+            ttl.index not in first,
+            bin(domains[ttl.index]).count("1"),
+            -len(ttl.teachers) - len(ttl.classgroups),
+            ttl.index,
+            timeslot,
+            rooms,
+        ))
+    pending.sort()
+    conflicts = []
+    for *_, ttli, timeslot, rooms in pending:
+        ttl = tt_lessons[ttli]
+        if not lesson_fits(allocation, ttl, timeslot):
+            blockers = critical_constraints(allocation, ttl, timeslot)
+            causes = set()
+            for c in blockers.values():
+                causes.update(c)
+            conflicts.append(LOAD_CONFLICT(
+                ttli, timeslot, sorted(blockers), sorted(causes)
+            ))
+            continue
+        allocate_lesson(allocation, ttl, timeslot)
+        if rooms and ttl.room_choices:
+            # Only the saved rooms which are still acceptable and free
+            # can be used (the fixed rooms are also in the saved list).
+            rset = set(rooms) - set(ttl.fixed_rooms)
+            rslots = allocation.room_weeks[timeslot:timeslot + ttl.length]
+            choices = [
+                [
+                    r for r in rc
+                    if r in rset and all(rs[r] == 0 for rs in rslots)
+                ]
+                for rc in ttl.room_choices
+            ]
+            n, rl = max_matching(choices)
+            if n:
+                allocate_lesson(allocation, ttl, timeslot, rl)
+            if n < len(rl):
+                conflicts.append(LOAD_CONFLICT(
+                    ttli, timeslot, [], [ROOMS_CHANGED]
+                ))
+    # The initial placements are not to be reversed
+    allocation.journal.clear()
+    return allocation, conflicts
 
-# If no blockers, do the placement, otherwise add to unallocated list/map.
-# When all done (?) calculate penalties?
-# Penalties are only relevant when all tt_lessons have been placed ...
-
-# What about (other) hard constraints, like room choices?
-        place_lesson_initial(allocation, tt_lessons, i, timeslot)
 
-    #for data in tt_state:
-    #    print(" --", data)
+def load_timetable(tt_data, state):
+    """Load the placements (see <load_allocation>), reporting any
+    conflicts together in a single message.
+    Return the allocation.
+    """
+    allocation, conflicts = load_allocation(tt_data, state)
+    if conflicts:
+        tt_lessons = tt_data.tt_lessons
+        lines = []
+        for c in conflicts:
+            blist = [
+                print_activity(tt_lessons[i]) for i in c.blockers if i > 0
+            ]
+            lines.append(T["LOAD_CONFLICT"].format(
+                activity=print_activity(tt_lessons[c.lesson]),
+                time=timeslot_text(c.timeslot),
+                causes=", ".join(c.causes),
+                blockers="; ".join(blist) or "–",
+            ))
+        REPORT(
+            "ERROR",
+            T["LOAD_CONFLICTS"].format(
+                n=len(conflicts), conflicts="\n".join(lines)
+            )
+        )
+    return allocation
 
 
 def print_activity(tlesson):
@@ -684,6 +1396,30 @@ def get_saved_state(tt_lessons) -> list[tuple[int, list[int]]]:
     return state
 
 
+def save_state(tt_data, allocation_state: list[list[int, list[int]]]):
+    """Write the placements – time slots and rooms (fixed and chosen)
+    – to the LESSONS table. This is the counterpart of
+    <get_saved_state>. Unplaced lessons get empty PLACEMENT and ROOMS
+    fields. All lessons are written in a single transaction.
+    Return <True> if successful, otherwise nothing is changed.
+    """
+    tt_text = init_timeslot_text()
+    room_tags = list(tt_data.room_index)
+    updates = []
+    for ttl in tt_data.tt_lessons[1:]:
+        t, rooms = allocation_state[ttl.index]
+        if t:
+            rlist = [room_tags[r] for r in ttl.fixed_rooms]
+            rlist += [room_tags[r] for r in rooms if r]
+        else:
+            rlist = []
+        updates.append((
+            ttl.lesson_id,
+            [("PLACEMENT", tt_text(t)), ("ROOMS", ",".join(rlist))]
+        ))
+    return db_bulk_update("LESSONS", "lid", updates)
+
+
 # See init_timeslot_text below
 def timeslot_text(timeslot):
     days = get_days()
@@ -734,29 +1470,15 @@ def test_room_allocation(
                 return False
         timeslot += 1
         length -= 1
-    # Check that the rooms are in the requirements lists.
-#TODO: Check this:
-    # This assumes correct ordering!
-    for i, r in enumerate(test_rooms):
-        if r not in requirements[i]:
-            print("  ====> choice mismatch:", test_rooms, "\n vs.", requirements)
-            return False
+    # Check that the rooms can be correlated with the requirements lists
+    # (the order is not significant)
+    rset = set(test_rooms)
+    n, rl = max_matching([[r for r in req if r in rset] for req in requirements])
+    if n < len(requirements):
+        print("  ====> choice mismatch:", test_rooms, "\n vs.", requirements)
+        return False
     return True
 
-# A more complicated alternative to the last bit (probably unnecessary):
-#    # Attempt to correlate requested rooms with required rooms
-#    def select(rs, ri):
-#        # A recursive function
-#        try:
-#            rs.intersection(requirements[ri])
-#        except IndexError:
-#            return True # all requirements tested
-#        for r in intersects.pop():
-#            if select(rs - {r}, ri + 1):
-#                return True
-#        return False
-#    return select(set(test_rooms), 0)
-
 
 # --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
 
@@ -802,9 +1524,152 @@ if __name__ == '__main__':
     #    print("  §§", s)
 
     print("\n+ load timetable using saved placements")
-    load_timetable(TT_DATA, state)
+    allocation = load_timetable(TT_DATA, state)
     print(" ... done")
 
+    print("\n+ compare feasibility tests (all lessons, all slots)")
+    from timeit import default_timer as timer
+    from contextlib import redirect_stdout
+    tests = [
+        (ttl, t)
+        for ttl in TT_DATA.tt_lessons[1:]
+        for t in range(1, len(allocation.teacher_weeks))
+    ]
+    allocation_np = AllocationNP(TT_DATA)
+    for ttli, (t, rooms) in enumerate(allocation.allocation_state):
+        if t:
+            place_lesson_initial(
+                allocation_np, TT_DATA.tt_lessons, ttli, t
+            )
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start = timer()
+        n0 = sum(
+            not critical_constraints(allocation, ttl, t) for ttl, t in tests
+        )
+        t0 = timer() - start
+    start = timer()
+    n1 = sum(lesson_fits(allocation, ttl, t) for ttl, t in tests)
+    t1 = timer() - start
+    start = timer()
+    n2 = sum(lesson_fits(allocation_np, ttl, t) for ttl, t in tests)
+    t2 = timer() - start
+    start = timer()
+    n3 = sum(not allocation_np.is_blocked(ttl, t) for ttl, t in tests)
+    t3 = timer() - start
+    start = timer()
+    n4 = sum(
+        int(allocation_np.free_starts(ttl).sum())
+        for ttl in TT_DATA.tt_lessons[1:]
+    )
+    t4 = timer() - start
+    print(f"  {len(tests)} tests")
+    print(f"  critical_constraints:        {t0:8.4f} s ({n0} possible)")
+    print(f"  lesson_fits (lists):         {t1:8.4f} s ({n1} possible)")
+    print(f"  lesson_fits (numpy):         {t2:8.4f} s ({n2} possible)")
+    print(f"  AllocationNP.is_blocked:     {t3:8.4f} s ({n3} possible)")
+    print(f"  AllocationNP.free_starts:    {t4:8.4f} s ({n4} possible)")
+
+    print("\n+ tentative moves with the journal (all lessons, all slots)")
+    from copy import deepcopy
+    weeks0 = deepcopy((
+        allocation.teacher_weeks,
+        allocation.group_weeks,
+        allocation.class_weeks,
+        allocation.room_weeks,
+        allocation.allocation_state,
+    ))
+    n = 0
+    start = timer()
+    for ttl, t in tests:
+        if lesson_fits(allocation, ttl, t):
+            undo_changes(allocation, allocate_lesson(allocation, ttl, t))
+            n += 1
+    t5 = timer() - start
+    print(f"  {n} moves made and reversed: {t5:8.4f} s")
+    assert weeks0 == (
+        allocation.teacher_weeks,
+        allocation.group_weeks,
+        allocation.class_weeks,
+        allocation.room_weeks,
+        allocation.allocation_state,
+    )
+    print("  ... allocation restored")
+
+    print("\n+ room choices: one activity at a time, then joint repair")
+    choice_lessons = [
+        ttl for ttl in TT_DATA.tt_lessons[1:]
+        if ttl.room_choices and allocation.allocation_state[ttl.index][0]
+    ]
+    start = timer()
+    n = sum(
+        allocate_rooms(allocation, ttl, joint=False)
+        for ttl in choice_lessons
+    )
+    t6 = timer() - start
+    print(f"  {len(choice_lessons)} activities, {n} null rooms: {t6:8.4f} s")
+    start = timer()
+    n = repair_rooms(allocation)
+    t7 = timer() - start
+    print(f"  after repair, {n} null rooms: {t7:8.4f} s")
+    allocation.journal.clear()
+
+    print("\n+ seek placements (all lessons)")
+    from timetable.tt_penalties import PenaltyTracker, get_constraints
+    tracker = PenaltyTracker(allocation, get_constraints(allocation))
+    for alloc in (allocation, allocation_np):
+        start = timer()
+        seek = [
+            seek_placements(alloc, ttl, tracker if alloc is allocation else None)
+            for ttl in TT_DATA.tt_lessons[1:]
+        ]
+        t8 = timer() - start
+        n = sum(len(c) for c in seek)
+        nfree = sum(1 for c in seek for x in c if not x.blockers)
+        print(
+            f"  {type(alloc).__name__}: {n} candidates,"
+            f" {nfree} free: {t8:8.4f} s"
+        )
+    assert tracker.total() == tracker.evaluate_all()
+    for ttl, c in zip(TT_DATA.tt_lessons[1:], seek):
+        assert sorted(x.timeslot for x in c if not x.blockers) == [
+            t for t in range(1, len(allocation.teacher_weeks))
+            if lesson_fits(allocation_np, ttl, t)
+        ]
+
+    print("\n+ force placements (blocked slots of unfixed lessons)")
+    from random import Random
+    rng = Random(0)
+    trials = [
+        (ttl, x.timeslot)
+        for ttl, c in zip(TT_DATA.tt_lessons[1:], seek)
+        if not ttl.time
+        for x in c if x.blockers
+    ]
+    trials = rng.sample(trials, min(len(trials), 50))
+    n = 0
+    nmoves = 0
+    nblocked = 0
+    start = timer()
+    for ttl, t in trials:
+        chain, no_rooms = force_placement(allocation, ttl, t, tracker=tracker)
+        nblocked += bool(no_rooms)
+        if chain:
+            n += 1
+            nmoves += len(chain)
+            assert allocation.allocation_state[ttl.index][0] == t
+            for i, tx in chain:
+                assert 0 not in allocation.allocation_state[i][1]
+    t9 = timer() - start
+    for ttl in TT_DATA.tt_lessons[1:]:
+        t = allocation.allocation_state[ttl.index][0]
+        assert not t or not blocking_lessons(allocation, ttl, t)
+    allocation.journal.clear()
+    assert tracker.total() == tracker.evaluate_all()
+    print(
+        f"  {len(trials)} trials, {n} chains ({nmoves} moves),"
+        f" {nblocked} with rooms missing: {t9:8.4f} s"
+    )
+
     quit(0)
 
     print(f"ROOMS ({len(tt_data.room_index) - 1}):", tt_data.room_index)
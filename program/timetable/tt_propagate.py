@@ -0,0 +1,272 @@
+"""
+timetable/tt_propagate.py
+
+Last updated:  2026-10-16
+
+Reduce the lesson domains (possible starting slots) before a placement
+search by propagating the hard constraints, detecting some impossible
+situations early.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+T = TRANSLATIONS("timetable.tt_propagate")
+
+### +++++
+
+from typing import NamedTuple
+
+from timetable.tt_basic_data import TimetableData, mask2slots
+
+EMPTY_DOMAIN = "EMPTY_DOMAIN"
+TEACHER_OVERLOAD = "TEACHER_OVERLOAD"
+GROUP_OVERLOAD = "GROUP_OVERLOAD"
+
+### -----
+
+
+class INFEASIBILITY(NamedTuple):
+    kind: str           # EMPTY_DOMAIN, TEACHER_OVERLOAD, GROUP_OVERLOAD
+    index: int          # activity, teacher or atomic group index
+    needed: int         # number of periods needed
+    available: int      # number of periods available
+
+
+def cover(starts: int, length: int) -> int:
+    """Return the bitmask of the time slots covered by an activity of
+    the given length starting in any of the slots in <starts>.
+    """
+    c = starts
+    for i in range(1, length):
+        c |= starts << i
+    return c
+
+
+def starts_covering(cells: int, length: int) -> int:
+    """Return the bitmask of the starting slots from which an activity
+    of the given length would cover one of the slots in <cells>.
+    """
+    s = cells
+    for i in range(1, length):
+        s |= cells >> i
+    return s
+
+
+def compulsory(starts: int, length: int) -> int:
+    """Return the bitmask of the time slots covered by an activity of
+    the given length whichever of the slots in <starts> it starts in.
+    """
+    if not starts:
+        return 0
+    c = -1
+    for t in mask2slots(starts):
+        c &= ((1 << length) - 1) << t
+    return c
+
+
+def propagate_domains(
+    tt_data: TimetableData,
+    domains: list[int],
+) -> list[INFEASIBILITY]:
+    """Remove from the lesson domains (<domains>, initially a copy of
+    <tt_data.lesson_domains>) the starting slots which can't be part of
+    a valid timetable because of the "hard" constraints:
+     - the time slots which an activity must cover (e.g. with a fixed
+       time or only one possible slot) are not available to other
+       activities with a common teacher, atomic group or fixed room,
+     - activities with the same parallel tag and weight '+' (see
+       <get_parallels>) must have the same starting slot – and may not
+       share a resource,
+     - activities of a lesson group must be on different days (see
+       <get_constraints> in tt_penalties), so a day which is certain
+       for one of them is not available to the others.
+    This is repeated until no domain changes. Then the number of
+    periods needed by each teacher and atomic group is compared with
+    the number of slots they could possibly use.
+    <domains> is changed in place, this can be done more than once.
+    <tt_data> is not changed.
+    Return a list of the problems found – non-empty if no valid
+    timetable is possible.
+    """
+    tt_lessons = tt_data.tt_lessons
+    nperiods = tt_data.periods_per_day
+    day_masks = [
+        (((1 << nperiods) - 1) << (d * nperiods + 1))
+        for d in range(tt_data.days_per_week)
+    ]
+    # The activities sharing a resource with each activity
+    t_lessons = [[] for i in range(len(tt_data.teacher_index))]
+    g_lessons = [[] for i in range(tt_data.n_class_group_atoms + 1)]
+    r_lessons = [[] for i in range(len(tt_data.room_index))]
+    for ttl in tt_lessons[1:]:
+        for i in ttl.teachers:
+            t_lessons[i].append(ttl.index)
+        for i in ttl.classgroups:
+            g_lessons[i].append(ttl.index)
+        for i in ttl.fixed_rooms:
+            r_lessons[i].append(ttl.index)
+    neighbours = [None]
+    for ttl in tt_lessons[1:]:
+        nset = set()
+        for i in ttl.teachers:
+            nset.update(t_lessons[i])
+        for i in ttl.classgroups:
+            nset.update(g_lessons[i])
+        for i in ttl.fixed_rooms:
+            nset.update(r_lessons[i])
+        nset.discard(ttl.index)
+        neighbours.append(nset)
+    problems = []
+    parallels = [[] for ttl in tt_lessons]
+    for ttlis, w in tt_data.parallels:
+        if w == '+':
+            for i in ttlis:
+                for j in ttlis:
+                    if j != i:
+                        parallels[i].append(j)
+                        # Parallel activities may not share a resource
+                        if j in neighbours[i] and domains[i]:
+                            domains[i] = 0
+                            problems.append(
+                                INFEASIBILITY(EMPTY_DOMAIN, i, 1, 0)
+                            )
+    lg_lessons = {}
+    for ttl in tt_lessons[1:]:
+        try:
+            lg_lessons[ttl.lesson_group].append(ttl.index)
+        except KeyError:
+            lg_lessons[ttl.lesson_group] = [ttl.index]
+    different_days = [
+        [j for j in lg_lessons[ttl.lesson_group] if j != ttl.index]
+        if ttl else []
+        for ttl in tt_lessons
+    ]
+
+    pending = list(range(1, len(tt_lessons)))
+    queued = set(pending)
+
+    def restrict(j: int, mask: int):
+        d = domains[j]
+        d1 = d & mask
+        if d1 != d:
+            domains[j] = d1
+            if d1 == 0:
+                problems.append(INFEASIBILITY(EMPTY_DOMAIN, j, 1, 0))
+            elif j not in queued:
+                pending.append(j)
+                queued.add(j)
+
+    while pending:
+        i = pending.pop()
+        queued.discard(i)
+        d = domains[i]
+        if d == 0:
+            continue
+        # Slots this activity is certain to cover
+        cells = compulsory(d, tt_lessons[i].length)
+        if cells:
+            for j in neighbours[i]:
+                restrict(j, ~starts_covering(cells, tt_lessons[j].length))
+        for j in parallels[i]:
+            restrict(j, d)
+        for dm in day_masks:
+            if d & ~dm == 0:
+                for j in different_days[i]:
+                    restrict(j, ~dm)
+                break
+
+    ## Capacity of the teachers and atomic groups
+    for lessons, kind in (
+        (t_lessons, TEACHER_OVERLOAD),
+        (g_lessons, GROUP_OVERLOAD),
+    ):
+        for i, ttlis in enumerate(lessons):
+            if i == 0 or not ttlis:
+                continue
+            needed = 0
+            cells = 0
+            for j in ttlis:
+                n = tt_lessons[j].length
+                needed += n
+                cells |= cover(domains[j], n)
+            available = bin(cells).count("1")
+            if needed > available:
+                problems.append(INFEASIBILITY(kind, i, needed, available))
+    return problems
+
+
+def report_infeasibility(
+    tt_data: TimetableData,
+    problems: list[INFEASIBILITY],
+):
+    """Report the problems found by <propagate_domains> in a single
+    message.
+    """
+    from timetable.tt_placement import print_activity
+    tt_lessons = tt_data.tt_lessons
+    tlist = list(tt_data.teacher_index)
+    lines = []
+    for p in problems:
+        if p.kind == EMPTY_DOMAIN:
+            item = print_activity(tt_lessons[p.index])
+        elif p.kind == TEACHER_OVERLOAD:
+            item = tlist[p.index]
+        else:
+            ci, b = tt_data.atom_bits[p.index]
+            item = f"{list(tt_data.class_index)[ci]} ({b:#x})"
+        lines.append(T[p.kind].format(
+            item=item, n=p.needed, m=p.available
+        ))
+    REPORT(
+        "ERROR",
+        T["INFEASIBLE"].format(problems="\n".join(lines))
+    )
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    open_database()
+
+    tt_data = TimetableData()
+    domains = list(tt_data.lesson_domains)
+    n0 = sum(bin(d).count("1") for d in domains)
+    start = timer()
+    problems = propagate_domains(tt_data, domains)
+    t = timer() - start
+    n1 = sum(bin(d).count("1") for d in domains)
+    print(f"\n+ propagation: {n0} -> {n1} possible starts, {t:.4f} s")
+    for p in problems:
+        print("  !!!", p)
+    # A second pass changes nothing
+    propagate_domains(tt_data, domains)
+    assert n1 == sum(bin(d).count("1") for d in domains)
+    # The original domains are unchanged
+    assert n0 == sum(bin(d).count("1") for d in tt_data.lesson_domains)
@@ -0,0 +1,223 @@
+"""
+timetable/tt_snapshot.py
+
+Last updated:  2026-10-16
+
+A compact binary form of an allocation state (the time slot and chosen
+rooms of each activity), so that alternative timetables can be saved,
+compared and loaded without rewriting the LESSONS table.
+
+
+=+LICENCE=============================
+Copyright 2026 Michael Towers
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+=-LICENCE========================================
+"""
+
+if __name__ == "__main__":
+    import sys, os
+    this = sys.path[0]
+    appdir = os.path.dirname(this)
+    sys.path[0] = appdir
+    basedir = os.path.dirname(appdir)
+    from core.base import start
+    start.setup(os.path.join(basedir, 'TESTDATA'))
+
+#T = TRANSLATIONS("timetable.tt_snapshot")
+
+### +++++
+
+import sys
+import struct
+from array import array
+
+from timetable.tt_basic_data import TimetableData
+
+# The snapshot layout (all numbers little-endian):
+#   header: magic, version, days per week, periods per day,
+#           number of activities, number of rooms in the room list,
+#           length of the room-tag table (bytes)
+#   lesson-ids (uint32, one per activity)
+#   time slots (uint16, one per activity, 0 = unplaced)
+#   room counts (uint16, one per activity)
+#   rooms (uint16, all activities concatenated, index into the tags)
+#   room tags (utf-8, separated by newlines, index 0 is "")
+# The activities are identified by their lesson-ids and the rooms by
+# their tags, so that a snapshot remains usable when the activity and
+# room indexes change.
+MAGIC = b"WZTT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHIII")
+
+### -----
+
+
+def _le(a: array) -> bytes:
+    """Return the contents of the array as little-endian bytes.
+    """
+    if sys.byteorder != "little":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a
+
+
+def make_snapshot(
+    tt_data: TimetableData,
+    allocation_state: list[list[int, list[int]]],
+) -> bytes:
+    """Pack the allocation state (see <Allocation>) into a single
+    <bytes> object, which can be stored in a file or a BLOB field.
+    Only the chosen rooms (not the fixed ones) are included, null rooms
+    are left out.
+    """
+    tt_lessons = tt_data.tt_lessons
+    n = len(tt_lessons) - 1
+    lesson_ids = array("I", [ttl.lesson_id for ttl in tt_lessons[1:]])
+    slots = array("H", bytes(2 * n))
+    counts = array("H", bytes(2 * n))
+    rooms = array("H")
+    for i in range(n):
+        timeslot, rlist = allocation_state[i + 1]
+        if timeslot:
+            slots[i] = timeslot
+            rl = [r for r in rlist if r]
+            counts[i] = len(rl)
+            rooms.extend(rl)
+    tags = "\n".join(tt_data.room_index).encode("utf-8")
+    return b"".join((
+        HEADER.pack(
+            MAGIC,
+            VERSION,
+            tt_data.days_per_week,
+            tt_data.periods_per_day,
+            n,
+            len(rooms),
+            len(tags),
+        ),
+        _le(lesson_ids),
+        _le(slots),
+        _le(counts),
+        _le(rooms),
+        tags,
+    ))
+
+
+def read_snapshot(
+    tt_data: TimetableData,
+    data: bytes,
+) -> list[tuple[int, list[int]]]:
+    """Unpack a snapshot made by <make_snapshot>, returning a state list
+    like that from <get_saved_state> (index as <tt_data.tt_lessons>),
+    which can be passed to <load_allocation>.
+    Activities which are not in the snapshot are unplaced, snapshot
+    entries for unknown activities and unknown rooms are ignored.
+    Raise <ValueError> if the data is not a valid snapshot for the
+    current timetable structure (days and periods).
+    """
+    try:
+        magic, version, ndays, nperiods, n, nrooms, ltags = (
+            HEADER.unpack_from(data)
+        )
+    except struct.error:
+        raise ValueError("Snapshot too short")
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a timetable snapshot")
+    if (
+        ndays != tt_data.days_per_week
+        or nperiods != tt_data.periods_per_day
+    ):
+        raise ValueError("Snapshot has different days/periods")
+    p = HEADER.size
+    sizes = ((4 * n, "I"), (2 * n, "H"), (2 * n, "H"), (2 * nrooms, "H"))
+    arrays = []
+    for size, typecode in sizes:
+        arrays.append(_from_le(typecode, data[p:p + size]))
+        p += size
+    lesson_ids, slots, counts, rooms = arrays
+    tags = data[p:p + ltags].decode("utf-8").split("\n")
+    if len(rooms) != nrooms or len(tags) == 0 or p + ltags != len(data):
+        raise ValueError("Snapshot data corrupted")
+    # Map the snapshot's rooms to the current room indexes
+    room_index = tt_data.room_index
+    rmap = [room_index.get(tag, 0) for tag in tags]
+    saved = {}
+    r = 0
+    for i, lid in enumerate(lesson_ids):
+        nr = counts[i]
+        saved[lid] = (
+            slots[i],
+            [rmap[x] for x in rooms[r:r + nr] if rmap[x]]
+        )
+        r += nr
+    state = [(0, [])]
+    for ttl in tt_data.tt_lessons[1:]:
+        state.append(saved.get(ttl.lesson_id, (0, [])))
+    return state
+
+
+def save_snapshot(
+    tt_data: TimetableData,
+    allocation_state: list[list[int, list[int]]],
+    path: str,
+):
+    with open(path, "wb") as fh:
+        fh.write(make_snapshot(tt_data, allocation_state))
+
+
+def load_snapshot(
+    tt_data: TimetableData,
+    path: str,
+) -> list[tuple[int, list[int]]]:
+    with open(path, "rb") as fh:
+        return read_snapshot(tt_data, fh.read())
+
+
+# --#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#--#
+
+if __name__ == '__main__':
+    from timeit import default_timer as timer
+    from core.db_access import open_database
+    from timetable.tt_placement import (
+        get_saved_state,
+        load_allocation,
+        repair_rooms,
+    )
+    open_database()
+
+    tt_data = TimetableData()
+    allocation, conflicts = load_allocation(
+        tt_data, get_saved_state(tt_data.tt_lessons)
+    )
+    repair_rooms(allocation)
+    state0 = allocation.allocation_state
+    start = timer()
+    data = make_snapshot(tt_data, state0)
+    t1 = timer() - start
+    start = timer()
+    state = read_snapshot(tt_data, data)
+    t2 = timer() - start
+    print(f"\n+ snapshot: {len(data)} bytes")
+    print(f"  make: {t1:.5f} s, read: {t2:.5f} s")
+    allocation2, conflicts = load_allocation(tt_data, state)
+    assert allocation2.allocation_state == state0, "Snapshot mismatch"
+    print("  ... reloaded allocation matches")
@@ -1,7 +1,7 @@
 """
 ui/modules/class_editor.py
 
-Last updated:  2023-08-10
+Last updated:  2026-10-16
 
 Edit class data.
 
@@ -44,7 +44,7 @@ T = TRANSLATIONS("ui.modules.class_editor")
 ### +++++
 
 #from typing import NamedTuple
-from core.basic_data import clear_cache, get_rooms
+from core.basic_data import get_rooms
 from core.db_access import (
     open_database,
     db_read_unique,
@@ -119,7 +119,6 @@ class ClassEditorPage(Page):
 
     def enter(self):
         open_database()
-        clear_cache()
         self.week_table = WeekTable(self.AVAILABLE, self.week_table_changed)
         TT_CONFIG = MINION(DATAPATH("CONFIG/TIMETABLE"))
         self.constraint_handlers = {
@@ -1,7 +1,7 @@
 """
 ui/modules/course_editor.py
 
-Last updated:  2023-10-08
+Last updated:  2026-10-16
 
 Edit course and blocks+lessons data.
 
@@ -58,7 +58,6 @@ from core.db_access import (
 from core.teachers import Teachers
 from core.basic_data import (
     get_classes,
-    clear_cache,
     get_subjects,
     ParallelTag,
     DECIMAL_SEP,
@@ -163,7 +162,6 @@ class CourseEditorPage(Page):
 
     def enter(self):
         open_database()
-        clear_cache()
         self.init_data()
         if self.filter_field == "CLASS": pb = self.pb_CLASS
         elif self.filter_field == "TEACHER": pb = self.pb_TEACHER
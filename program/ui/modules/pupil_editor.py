@@ -1,7 +1,7 @@
 """
 ui/modules/pupil_editor.py
 
-Last updated:  2023-06-17
+Last updated:  2026-10-16
 
 Edit pupil data.
 
@@ -71,7 +71,7 @@ from ui.dialogs.dialog_pupil_groups import PupilGroupsDialog
 from ui.dialogs.dialog_constraint_number import NumberConstraintDialog
 from local.name_support import asciify, tvSplit
 from local.pupil_support import pupil_name, check_pid_valid
-from core.basic_data import get_classes, clear_cache
+from core.basic_data import get_classes
 
 TABLE_FIELDS = ( # fields displayed in class table
     "FIRSTNAME",
@@ -139,7 +139,6 @@ class PupilEditorPage(Page):
 
     def enter(self):
         open_database()
-        clear_cache()
         self.init_data()
 
     def  init_data(self):
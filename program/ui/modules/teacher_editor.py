@@ -1,7 +1,7 @@
 """
 ui/modules/teacher_editor.py
 
-Last updated:  2023-08-10
+Last updated:  2026-10-16
 
 Edit teacher data.
 
@@ -44,7 +44,6 @@ T = TRANSLATIONS("ui.modules.teacher_editor")
 ### +++++
 
 #from typing import NamedTuple
-from core.basic_data import clear_cache
 from core.db_access import (
     open_database,
     db_read_unique,
@@ -121,7 +120,6 @@ class TeacherEditorPage(Page):
 
     def enter(self):
         open_database()
-        clear_cache()
         self.week_table = WeekTable(self.AVAILABLE, self.week_table_changed)
         TT_CONFIG = MINION(DATAPATH("CONFIG/TIMETABLE"))
         self.constraint_handlers = {
@@ -2,7 +2,7 @@
 """
 ui/modules/timetable_editor.py
 
-Last updated:  2023-09-16
+Last updated:  2026-10-16
 
 Show a timetable grid and allow placement of lesson tiles.
 
@@ -43,7 +43,6 @@ T = TRANSLATIONS("ui.modules.timetable_editor")
 
 from ui.timetable_grid import GridPeriodsDays
 from core.basic_data import (
-    clear_cache,
     get_days,
     get_periods,
     get_classes,
@@ -84,7 +83,6 @@ class TimetableEditor(Page):
 
     def enter(self):
         open_database()
-        clear_cache()
         self.TT_CONFIG = MINION(DATAPATH("CONFIG/TIMETABLE"))
         tt = TimetableManager()
         self.timetable = tt